@@ -3,32 +3,362 @@ A low-level PDF generator.
 
 """
 
+import asyncio
 import base64
+import mmap
 import re
 import zlib
+from array import array
+from bisect import bisect_right
 from codecs import BOM_UTF16_BE
-from hashlib import md5
+from collections import OrderedDict
+from collections.abc import Sequence
+from functools import lru_cache
+from hashlib import blake2b, md5
+from itertools import chain, islice
 from math import ceil, log
+from operator import add
+from sys import byteorder
+from threading import Lock
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
 
 VERSION = __version__ = '0.11.0'
 
+_REFERENCE = re.compile(rb'(\d+) (\d+) R')
+_TRAILING_ZEROS = re.compile(r'(\.\d*?)0+ ')
+_TRAILER_ENTRIES = re.compile(rb'/(Size|Root|Info)\s+(\d+(?:\s+\d+\s+R)?)')
+_TRAILER_IDENTIFIER = re.compile(
+    rb'/ID\s*\[\s*(<[\da-fA-F\s]*>|\((?:\\.|[^\\)])*\))', re.S)
+
+# Tokens of PDF objects, and escapes of literal strings
+_TOKEN = re.compile(rb'''(?:\s|%[^\r\n]*)*(?:
+    (?P<open><<|\[)
+    |(?P<close>>>|\])
+    |(?P<reference>\d+\s+\d+\s+R(?![^\s/\[\]()<>{}%]))
+    |(?P<number>[+-]?(?:\d+\.?\d*|\.\d+))
+    |(?P<name>/[^\s/\[\]()<>{}%]*)
+    |(?P<hexadecimal><[\da-fA-F\s]*>)
+    |(?P<literal>\((?:\\.|[^\\)])*\))
+    |(?P<keyword>[a-zA-Z]+))''', re.X | re.S)
+_LITERAL_ESCAPE = re.compile(rb'\\([0-7]{1,3}|\r\n|.)', re.S)
+_LITERAL_ESCAPES = {
+    b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f',
+    b'\n': b'', b'\r': b'', b'\r\n': b''}
+_OBJECT_HEADER = re.compile(rb'\s*(\d+)\s+(\d+)\s+obj')
+_STREAM_KEYWORD = re.compile(rb'\s*stream\r?\n')
+_XREF_SUBSECTION = re.compile(rb'\s*(\d+)\s+(\d+)[ \t]*\r?\n')
+
+#: Deflate implementations available for :class:`Codec`, by name.
+#:
+#: Values are functions taking a compression level and a compression strategy,
+#: and returning a compressor object with ``compress`` and ``flush`` methods,
+#: as returned by :func:`zlib.compressobj`.
+DEFLATE_BACKENDS = {}
+
+# Backends used by default when installed, fastest first
+_PREFERRED_BACKENDS = ('zlib-ng', 'isal', 'libdeflate', 'zlib')
+
+# Attributes of objects, stored in slots by subclasses
+_OBJECT_SLOTS = ('number', 'offset', 'generation', 'free')
+
+# Prefixes of resource names, by resource category
+_RESOURCE_PREFIXES = {
+    'ColorSpace': 'CS',
+    'ExtGState': 'GS',
+    'Font': 'F',
+    'Pattern': 'P',
+    'Properties': 'MC',
+    'Shading': 'Sh',
+    'XObject': 'X',
+}
+
+# Numbers of components of image color spaces
+_IMAGE_COMPONENTS = {'Gray': 1, 'RGB': 3, 'CMYK': 4}
+_IMAGE_COLOR_SPACES = {
+    components: name for name, components in _IMAGE_COMPONENTS.items()}
+# Approximate size in bytes of the strips of images compressed at once
+_IMAGE_STRIP_SIZE = 1 << 20
+# PNG filter types, by predictor name
+_PNG_FILTERS = {'up': 2, 'paeth': 4}
+
+# Maximum delay in seconds between pauses of asynchronous writes
+_ASYNC_PAUSE_DELAY = 0.005
+# Number of objects whose cross-reference entries are written at once
+_XREF_BATCH_SIZE = 1000
+
+
+# Common integers, formatted once
+_INTEGERS = {number: str(number) for number in range(-256, 1025)}
+# Formats of floats, by number of decimals, always including a decimal point
+# so that only decimal trailing zeros are stripped
+_FLOAT_FORMATS = tuple(f'%#.{precision}f' for precision in range(16))
+
+
+def _format_number(number, precision=6):
+    """Convert int or float number to string, with ``precision`` decimals."""
+    if type(number) is int:
+        return _INTEGERS.get(number) or str(number)
+    elif number.is_integer():
+        return _INTEGERS.get(number) or str(int(number))
+    string = (_FLOAT_FORMATS[precision] % number).rstrip('0')
+    return _rounded_integer(string) if string[-1] == '.' else string
+
+
+def _rounded_integer(string):
+    """Format float number rounded to an integer, given as ``'x.'``."""
+    return '0' if string == '-0.' else string[:-1]
+
+
+def _format_operands(operands, precision=6):
+    """Convert operands to bytes and join them.
+
+    Numbers are rounded to ``precision`` decimals, other operands are
+    converted by :func:`_to_bytes`.
+
+    """
+    float_format = _FLOAT_FORMATS[precision]
+    strings = []
+    for operand in operands:
+        operand_type = type(operand)
+        if operand_type is float:
+            if operand.is_integer():
+                strings.append(_INTEGERS.get(operand) or str(int(operand)))
+            else:
+                string = (float_format % operand).rstrip('0')
+                strings.append(
+                    _rounded_integer(string) if string[-1] == '.' else string)
+        elif operand_type is int:
+            strings.append(_INTEGERS.get(operand) or str(operand))
+        elif operand_type is bytes:
+            strings.append(operand.decode('latin-1'))
+        elif isinstance(operand, float):
+            strings.append(_format_number(operand, precision))
+        else:
+            strings.append(_to_bytes(operand).decode('latin-1'))
+    return ' '.join(strings).encode('latin-1')
+
+
+def _flat_coordinates(values, columns, matrix=None):
+    """Get flat list of numbers from array of coordinates.
+
+    ``values`` is a N×``columns`` NumPy array, a :class:`memoryview`, or an
+    iterable of numbers or of rows of numbers. If ``matrix`` is given, it is
+    used to transform the coordinates considered as points.
+
+    """
+    if numpy is not None:
+        try:
+            memoryview(values)
+        except TypeError:
+            # Flatten other iterables, such as generators
+            values = _flat_numbers(values)
+        points = numpy.asarray(values, dtype=float).reshape(-1, 2)
+        if matrix is not None:
+            a, b, c, d, e, f = matrix
+            points = points @ numpy.array(((a, b), (c, d))) + (e, f)
+        numbers = points.ravel().tolist()
+    else:
+        numbers = _flat_numbers(values)
+        if len(numbers) % 2:
+            raise ValueError('Coordinates must be given by pairs.')
+        if matrix is not None:
+            a, b, c, d, e, f = matrix
+            xs, ys = numbers[::2], numbers[1::2]
+            numbers[::2] = [a * x + c * y + e for x, y in zip(xs, ys)]
+            numbers[1::2] = [b * x + d * y + f for x, y in zip(xs, ys)]
+    if len(numbers) % columns:
+        raise ValueError(f'Coordinates must be given by groups of {columns}.')
+    return numbers
+
+
+def _flat_numbers(values):
+    """Get flat list of numbers from iterable of numbers or rows of numbers."""
+    if isinstance(values, memoryview):
+        values = values.tolist()
+    numbers = []
+    for value in values:
+        if isinstance(value, (int, float)):
+            numbers.append(value)
+        else:
+            numbers.extend(value)
+    return numbers
+
+
+def _format_rows(numbers, columns, first_operator, operator, precision=6):
+    """Format rows of ``columns`` numbers followed by operators.
+
+    The first row is followed by ``first_operator``, the other ones by
+    ``operator``. All the numbers are formatted at once.
+
+    """
+    rows = len(numbers) // columns
+    row = ' '.join([f'%.{precision}f'] * columns)
+    template = (
+        f'{row} {first_operator}' + f'\n{row} {operator}' * (rows - 1) + ' ')
+    string = _TRAILING_ZEROS.sub(r'\1 ', template % tuple(numbers))
+    string = string.replace('. ', ' ').replace('-0 ', '0 ')
+    return string[:-1].encode('ascii')
+
+
+# Functions converting objects to bytes, by registered type
+_ENCODERS = {}
+# Functions converting objects to bytes, by exact type, found on demand
+_TYPE_ENCODERS = {}
+
+
+def register_encoder(type_, encoder):
+    """Register a function converting objects of given type to bytes.
+
+    The function is also used for the subclasses of the given type, unless
+    another function is registered for them.
+
+    :param type type_: Type of converted objects.
+    :param encoder: Function taking an object and returning bytes.
+
+    """
+    _ENCODERS[type_] = encoder
+    _TYPE_ENCODERS.clear()
+
 
 def _to_bytes(item):
     """Convert item to bytes."""
-    if isinstance(item, bytes):
+    if type(item) is bytes:
         return item
-    elif isinstance(item, float):
-        if item.is_integer():
-            return str(int(item)).encode('ascii')
-        else:
-            return f'{item:f}'.rstrip('0').encode('ascii')
-    elif isinstance(item, Object):
-        return item.data
-    return str(item).encode('ascii')
+    encoder = _TYPE_ENCODERS.get(type(item))
+    if encoder is None:
+        encoder = _TYPE_ENCODERS[type(item)] = next(
+            _ENCODERS[parent] for parent in type(item).__mro__
+            if parent in _ENCODERS)
+    return encoder(item)
+
+
+register_encoder(object, lambda item: str(item).encode('ascii'))
+register_encoder(bytes, lambda item: item)
+register_encoder(str, lambda item: item.encode('ascii'))
+register_encoder(
+    int, lambda item: (_INTEGERS.get(item) or str(int(item))).encode('ascii'))
+register_encoder(float, lambda item: _format_number(item).encode('ascii'))
+# Booleans are not numbers, keep their Python representation
+register_encoder(bool, lambda item: str(item).encode('ascii'))
+
+if numpy is not None:
+    register_encoder(
+        numpy.integer, lambda item: _to_bytes(int(item)))
+    register_encoder(
+        numpy.floating, lambda item: _to_bytes(float(item)))
+
+
+class _BufferedCompressor:
+    """Compressor object for implementations only providing a function."""
+    def __init__(self, compress):
+        self._compress = compress
+        self._chunks = []
+
+    def compress(self, data):
+        self._chunks.append(bytes(data))
+        return b''
+
+    def flush(self):
+        return self._compress(b''.join(self._chunks))
+
+
+def register_deflate_backend(name, compressobj):
+    """Register a Deflate implementation usable by codecs.
+
+    :param str name: Name of the implementation.
+    :param compressobj: Function taking a compression level and a compression
+      strategy, and returning a compressor object.
+
+    """
+    DEFLATE_BACKENDS[name] = compressobj
+
+
+register_deflate_backend(
+    'zlib', lambda level, strategy: zlib.compressobj(
+        level=level, strategy=strategy))
+
+try:
+    from zlib_ng import zlib_ng
+except ImportError:
+    pass
+else:
+    register_deflate_backend(
+        'zlib-ng', lambda level, strategy: zlib_ng.compressobj(
+            level=level, strategy=strategy))
+
+try:
+    from isal import isal_zlib
+except ImportError:
+    pass
+else:
+    # ISA-L only supports levels from 0 to 3
+    register_deflate_backend(
+        'isal', lambda level, strategy: isal_zlib.compressobj(
+            level=isal_zlib.ISAL_DEFAULT_COMPRESSION if level < 0 else
+            min(level // 3, isal_zlib.ISAL_BEST_COMPRESSION),
+            strategy=strategy))
+
+try:
+    import deflate
+except ImportError:
+    pass
+else:
+    # libdeflate only provides one-shot compression
+    def _libdeflate_compressobj(level, strategy):
+        level = 6 if level < 0 else level
+        return _BufferedCompressor(
+            lambda data: deflate.zlib_compress(data, level))
+
+    register_deflate_backend('libdeflate', _libdeflate_compressobj)
+
+
+class Codec:
+    """Deflate codec used to compress streams.
+
+    :param str backend: Name of a Deflate implementation registered in
+      :data:`DEFLATE_BACKENDS`. Default is the fastest installed one among
+      ``'zlib-ng'``, ``'isal'``, ``'libdeflate'`` and ``'zlib'``.
+    :param int level: Compression level, from 0 to 9.
+    :param int strategy: Compression strategy, as defined by :mod:`zlib`.
+      Ignored by implementations that don’t support strategies.
+
+    """
+    def __init__(self, backend=None, level=9,
+                 strategy=zlib.Z_DEFAULT_STRATEGY):
+        if backend is None:
+            backend = next(
+                name for name in _PREFERRED_BACKENDS
+                if name in DEFLATE_BACKENDS)
+        elif backend not in DEFLATE_BACKENDS:
+            raise ValueError(f'Unknown Deflate backend: {backend!r}')
+        #: Name of the Deflate implementation.
+        self.backend = backend
+        #: Compression level.
+        self.level = level
+        #: Compression strategy.
+        self.strategy = strategy
+
+    def compressobj(self):
+        """Create a compressor object."""
+        return DEFLATE_BACKENDS[self.backend](self.level, self.strategy)
+
+    def compress(self, data):
+        """Compress data."""
+        compressobj = self.compressobj()
+        return compressobj.compress(data) + compressobj.flush()
+
+
+_DEFAULT_CODEC = Codec()
 
 
 class Object:
     """Base class for PDF objects."""
+    # Subclasses store their attributes in slots, their instance dictionary
+    # is only created for attributes added by other subclasses
     def __init__(self):
         #: Number of the object.
         self.number = None
@@ -43,8 +373,12 @@ class Object:
     @property
     def indirect(self):
         """Indirect representation of an object."""
+        return self._indirect(self.data)
+
+    def _indirect(self, data):
+        """Indirect representation of an object with given ``data``."""
         header = f'{self.number} {self.generation} obj\n'.encode()
-        return header + self.data + b'\nendobj'
+        return header + data + b'\nendobj'
 
     @property
     def reference(self):
@@ -62,30 +396,124 @@ class Object:
         return not self.generation and not isinstance(self, Stream)
 
 
+register_encoder(Object, lambda item: item.data)
+
+
 class Dictionary(Object, dict):
     """PDF Dictionary object."""
+    __slots__ = _OBJECT_SLOTS
+
     def __init__(self, values=None):
         Object.__init__(self)
         dict.__init__(self, values or {})
 
     @property
     def data(self):
-        result = [
-            b'/' + _to_bytes(key) + b' ' + _to_bytes(value)
-            for key, value in self.items()]
-        return b'<<' + b''.join(result) + b'>>'
+        return bytes(_write_item(self, bytearray()))
+
+
+class _Content:
+    """Stream content, written in a growable buffer.
+
+    Items are converted to bytes when they are appended, and separated by
+    newlines.
+
+    """
+    __slots__ = ('_buffer',)
+
+    def __init__(self, items=()):
+        # Buffer is created when the first item is appended
+        self._buffer = None
+        self.extend(items)
+
+    def __bytes__(self):
+        return bytes(self.getvalue())
+
+    def __iter__(self):
+        # Content can be given as items of another content
+        if self._buffer is not None:
+            yield bytes(self._buffer)
+
+    def append(self, item):
+        if self._buffer is None:
+            self._buffer = bytearray()
+        else:
+            self._buffer += b'\n'
+        self._buffer += item if type(item) is bytes else _to_bytes(item)
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def getvalue(self):
+        """Get content data."""
+        return b'' if self._buffer is None else self._buffer
+
+
+class _DeflatedContent(_Content):
+    """Stream content compressed while items are appended.
+
+    Only the compressed data is kept in memory. Content can't be appended
+    anymore once compression is finished.
+
+    """
+    __slots__ = ('_compressobj',)
+    __iter__ = None
+
+    def __init__(self, items=(), codec=None):
+        self._compressobj = (codec or _DEFAULT_CODEC).compressobj()
+        super().__init__(items)
+
+    def append(self, item):
+        if self._compressobj is None:
+            raise ValueError('Stream data has already been compressed.')
+        if self._buffer is None:
+            self._buffer = bytearray()
+        else:
+            self._buffer += self._compressobj.compress(b'\n')
+        self._buffer += self._compressobj.compress(_to_bytes(item))
+
+    def getvalue(self):
+        """Finish compression and get compressed data."""
+        if self._compressobj is not None:
+            if self._buffer is None:
+                self._buffer = bytearray()
+            self._buffer += self._compressobj.flush()
+            self._compressobj = None
+        return self._buffer
 
 
 class Stream(Object):
     """PDF Stream object."""
-    def __init__(self, stream=None, extra=None, compress=False):
+    __slots__ = (
+        *_OBJECT_SLOTS, 'codec', 'stream', 'extra', '_used_resources',
+        'compress', 'precision')
+
+    def __init__(self, stream=None, extra=None, compress=False,
+                 incremental=False, codec=None, precision=6):
         super().__init__()
-        #: Python array of data composing stream.
-        self.stream = stream or []
+        #: :class:`Codec` used to compress the stream data. Default is the
+        #: codec of the document, or a default codec for incremental streams
+        #: and streams not included in a document.
+        self.codec = codec
+        #: Content of the stream. Items appended to the content are converted
+        #: to bytes and separated by newlines.
+        #:
+        #: When ``incremental`` is set to ``True``, items are compressed as
+        #: soon as they are appended, and only the compressed data is kept.
+        self.stream = (
+            _DeflatedContent(stream or (), codec) if incremental
+            else _Content(stream or ()))
         #: Metadata containing at least the length of the Stream.
         self.extra = extra or {}
+        # Names of the resources used by the stream, with their category,
+        # set when the first resource is used
+        self._used_resources = None
         #: Compress the stream data if set to ``True``. Default is ``False``.
-        self.compress = compress
+        self.compress = compress or incremental
+        #: Maximum number of decimals of the numbers given to operators, from
+        #: 0 to 15. Default is 6.
+        self.precision = precision
 
     def begin_marked_content(self, tag, property_list=None):
         """Begin marked-content sequence."""
@@ -127,10 +555,8 @@ class Stream(Object):
         y2)`` as the Bézier control points.
 
         """
-        self.stream.append(b' '.join((
-            _to_bytes(x1), _to_bytes(y1),
-            _to_bytes(x2), _to_bytes(y2),
-            _to_bytes(x3), _to_bytes(y3), b'c')))
+        self.stream.append(_format_operands(
+            (x1, y1, x2, y2, x3, y3, b'c'), self.precision))
 
     def curve_start_to(self, x2, y2, x3, y3):
         """Add cubic Bézier curve to current path
@@ -139,9 +565,8 @@ class Stream(Object):
         ``(x2, y2)`` as the Bézier control points.
 
         """
-        self.stream.append(b' '.join((
-            _to_bytes(x2), _to_bytes(y2),
-            _to_bytes(x3), _to_bytes(y3), b'v')))
+        self.stream.append(_format_operands(
+            (x2, y2, x3, y3, b'v'), self.precision))
 
     def curve_end_to(self, x1, y1, x3, y3):
         """Add cubic Bézier curve to current path
@@ -150,13 +575,31 @@ class Stream(Object):
         y3)`` as the Bézier control points.
 
         """
-        self.stream.append(b' '.join((
-            _to_bytes(x1), _to_bytes(y1),
-            _to_bytes(x3), _to_bytes(y3), b'y')))
+        self.stream.append(_format_operands(
+            (x1, y1, x3, y3, b'y'), self.precision))
+
+    def curves(self, points, matrix=None):
+        """Add cubic Bézier curves to current path.
+
+        Each curve is defined by 3 consecutive points, the first two being
+        the Bézier control points, as in :meth:`curve_to`.
+
+        :param points: Coordinates of the points, as a N×2 array.
+        :type points: NumPy array, :class:`memoryview` or :term:`iterable`
+        :param matrix: Affine transformation ``(a, b, c, d, e, f)`` applied
+          to the points.
+        :type matrix: :term:`iterable`
+
+        """
+        numbers = _flat_coordinates(points, 6, matrix)
+        if numbers:
+            self.stream.append(
+                _format_rows(numbers, 6, 'c', 'c', self.precision))
 
     def draw_x_object(self, reference):
         """Draw object given by reference."""
-        self.stream.append(b'/' + _to_bytes(reference) + b' Do')
+        name = self._use_resource('XObject', reference)
+        self.stream.append(b'/' + name + b' Do')
 
     def end(self):
         """End path without filling or stroking."""
@@ -208,7 +651,8 @@ class Stream(Object):
         :param raw_data: The raw pixel data.
 
         """
-        data = zlib.compress(raw_data) if self.compress else raw_data
+        codec = self.codec or _DEFAULT_CODEC
+        data = codec.compress(raw_data) if self.compress else raw_data
         a85_data = base64.a85encode(data) + b'~>'
         self.stream.append(b' '.join((
             b'BI',
@@ -227,19 +671,49 @@ class Stream(Object):
 
     def line_to(self, x, y):
         """Add line from current point to point ``(x, y)``."""
-        self.stream.append(b' '.join((_to_bytes(x), _to_bytes(y), b'l')))
+        self.stream.append(_format_operands((x, y, b'l'), self.precision))
 
     def move_to(self, x, y):
         """Begin new subpath by moving current point to ``(x, y)``."""
-        self.stream.append(b' '.join((_to_bytes(x), _to_bytes(y), b'm')))
+        self.stream.append(_format_operands((x, y, b'm'), self.precision))
 
     def move_text_to(self, x, y):
         """Move text to next line at ``(x, y)`` distance from previous line."""
-        self.stream.append(b' '.join((_to_bytes(x), _to_bytes(y), b'Td')))
+        self.stream.append(_format_operands((x, y, b'Td'), self.precision))
 
     def paint_shading(self, name):
         """Paint shape and color shading using shading dictionary ``name``."""
-        self.stream.append(b'/' + _to_bytes(name) + b' sh')
+        self.stream.append(b'/' + self._use_resource('Shading', name) + b' sh')
+
+    def polygon(self, points, close=True, matrix=None):
+        """Add subpath going through ``points``, closed by default.
+
+        :param points: Coordinates of the points, as a N×2 array.
+        :type points: NumPy array, :class:`memoryview` or :term:`iterable`
+        :param bool close: Whether the subpath is closed.
+        :param matrix: Affine transformation ``(a, b, c, d, e, f)`` applied
+          to the points.
+        :type matrix: :term:`iterable`
+
+        """
+        numbers = _flat_coordinates(points, 2, matrix)
+        if numbers:
+            self.stream.append(
+                _format_rows(numbers, 2, 'm', 'l', self.precision))
+            if close:
+                self.close()
+
+    def polyline(self, points, matrix=None):
+        """Add open subpath going through ``points``.
+
+        :param points: Coordinates of the points, as a N×2 array.
+        :type points: NumPy array, :class:`memoryview` or :term:`iterable`
+        :param matrix: Affine transformation ``(a, b, c, d, e, f)`` applied
+          to the points.
+        :type matrix: :term:`iterable`
+
+        """
+        self.polygon(points, close=False, matrix=matrix)
 
     def pop_state(self):
         """Restore graphic state."""
@@ -256,9 +730,34 @@ class Stream(Object):
         dimensions.
 
         """
-        self.stream.append(b' '.join((
-            _to_bytes(x), _to_bytes(y),
-            _to_bytes(width), _to_bytes(height), b're')))
+        self.stream.append(_format_operands(
+            (x, y, width, height, b're'), self.precision))
+
+    def rectangles(self, rectangles, matrix=None):
+        """Add rectangles to current path as complete subpaths.
+
+        :param rectangles: Lower-left corners and dimensions of the
+          rectangles, as a N×4 array.
+        :type rectangles: NumPy array, :class:`memoryview` or
+          :term:`iterable`
+        :param matrix: Affine transformation ``(a, 0, 0, d, e, f)`` applied
+          to the rectangles, that can only be scaled and translated.
+        :type matrix: :term:`iterable`
+
+        """
+        if matrix is not None:
+            a, b, c, d, e, f = matrix
+            if b or c:
+                raise ValueError('Rectangles can’t be rotated or skewed.')
+            # Only translate corners, as dimensions are points too
+            corners = _flat_coordinates(rectangles, 4, (a, 0, 0, d, e, f))
+            numbers = _flat_coordinates(rectangles, 4, (a, 0, 0, d, 0, 0))
+            numbers[::4], numbers[1::4] = corners[::4], corners[1::4]
+        else:
+            numbers = _flat_coordinates(rectangles, 4)
+        if numbers:
+            self.stream.append(
+                _format_rows(numbers, 4, 're', 're', self.precision))
 
     def set_color_rgb(self, r, g, b, stroke=False):
         """Set RGB color for nonstroking operations.
@@ -267,9 +766,8 @@ class Stream(Object):
         ``True``.
 
         """
-        self.stream.append(b' '.join((
-            _to_bytes(r), _to_bytes(g), _to_bytes(b),
-            (b'RG' if stroke else b'rg'))))
+        self.stream.append(_format_operands(
+            (r, g, b, b'RG' if stroke else b'rg'), self.precision))
 
     def set_color_space(self, space, stroke=False):
         """Set the nonstroking color space.
@@ -277,8 +775,8 @@ class Stream(Object):
         If stroke is set to ``True``, set the stroking color space instead.
 
         """
-        self.stream.append(
-            b'/' + _to_bytes(space) + b' ' + (b'CS' if stroke else b'cs'))
+        name = self._use_resource('ColorSpace', space)
+        self.stream.append(b'/' + name + b' ' + (b'CS' if stroke else b'cs'))
 
     def set_color_special(self, name, stroke=False, *operands):
         """Set special color for nonstroking operations.
@@ -287,10 +785,10 @@ class Stream(Object):
 
         """
         if name:
-            operands = (*operands, b'/' + _to_bytes(name))
-        self.stream.append(
-            b' '.join(_to_bytes(operand) for operand in operands) + b' ' +
-            (b'SCN' if stroke else b'scn'))
+            operands = (
+                *operands, b'/' + self._use_resource('Pattern', name))
+        self.stream.append(_format_operands(
+            (*operands, b'SCN' if stroke else b'scn'), self.precision))
 
     def set_dash(self, dash_array, dash_phase):
         """Set dash line pattern.
@@ -301,33 +799,40 @@ class Stream(Object):
         :type dash_phase: :obj:`int`
 
         """
-        self.stream.append(b' '.join((
-            Array(dash_array).data, _to_bytes(dash_phase), b'd')))
+        dash_array = _format_operands(dash_array, self.precision)
+        self.stream.append(_format_operands(
+            (b'[' + dash_array + b']', dash_phase, b'd'), self.precision))
 
     def set_font_size(self, font, size):
         """Set font name and size."""
+        name = self._use_resource('Font', font)
         self.stream.append(
-            b'/' + _to_bytes(font) + b' ' + _to_bytes(size) + b' Tf')
+            _format_operands((b'/' + name, size, b'Tf'), self.precision))
 
     def set_text_rendering(self, mode):
         """Set text rendering mode."""
-        self.stream.append(_to_bytes(mode) + b' Tr')
+        self.stream.append(
+            _format_operands((mode, b'Tr'), self.precision))
 
     def set_text_rise(self, height):
         """Set text rise."""
-        self.stream.append(_to_bytes(height) + b' Ts')
+        self.stream.append(
+            _format_operands((height, b'Ts'), self.precision))
 
     def set_line_cap(self, line_cap):
         """Set line cap style."""
-        self.stream.append(_to_bytes(line_cap) + b' J')
+        self.stream.append(
+            _format_operands((line_cap, b'J'), self.precision))
 
     def set_line_join(self, line_join):
         """Set line join style."""
-        self.stream.append(_to_bytes(line_join) + b' j')
+        self.stream.append(
+            _format_operands((line_join, b'j'), self.precision))
 
     def set_line_width(self, width):
         """Set line width."""
-        self.stream.append(_to_bytes(width) + b' w')
+        self.stream.append(
+            _format_operands((width, b'w'), self.precision))
 
     def set_matrix(self, a, b, c, d, e, f):
         """Set current transformation matrix.
@@ -346,13 +851,13 @@ class Stream(Object):
         :type f: :obj:`int` or :obj:`float`
 
         """
-        self.stream.append(b' '.join((
-            _to_bytes(a), _to_bytes(b), _to_bytes(c),
-            _to_bytes(d), _to_bytes(e), _to_bytes(f), b'cm')))
+        self.stream.append(_format_operands(
+            (a, b, c, d, e, f, b'cm'), self.precision))
 
     def set_miter_limit(self, miter_limit):
         """Set miter limit."""
-        self.stream.append(_to_bytes(miter_limit) + b' M')
+        self.stream.append(
+            _format_operands((miter_limit, b'M'), self.precision))
 
     def set_state(self, state_name):
         """Set specified parameters in graphic state.
@@ -360,7 +865,8 @@ class Stream(Object):
         :param state_name: Name of the graphic state.
 
         """
-        self.stream.append(b'/' + _to_bytes(state_name) + b' gs')
+        name = self._use_resource('ExtGState', state_name)
+        self.stream.append(b'/' + name + b' gs')
 
     def set_text_matrix(self, a, b, c, d, e, f):
         """Set current text and text line transformation matrix.
@@ -379,9 +885,8 @@ class Stream(Object):
         :type f: :obj:`int` or :obj:`float`
 
         """
-        self.stream.append(b' '.join((
-            _to_bytes(a), _to_bytes(b), _to_bytes(c),
-            _to_bytes(d), _to_bytes(e), _to_bytes(f), b'Tm')))
+        self.stream.append(_format_operands(
+            (a, b, c, d, e, f, b'Tm'), self.precision))
 
     def show_text(self, text):
         """Show text strings with individual glyph positioning."""
@@ -401,19 +906,319 @@ class Stream(Object):
 
     @property
     def data(self):
-        stream = b'\n'.join(_to_bytes(item) for item in self.stream)
+        return self._data()
+
+    def _use_resource(self, category, name):
+        """Store resource as used by the stream, and get its name as bytes."""
+        name = _to_bytes(name)
+        if self._used_resources is None:
+            self._used_resources = set()
+        self._used_resources.add((category, name))
+        return name
+
+    def _data(self, codec=None):
+        """Stream data, compressed with ``codec`` if stream has no codec."""
+        return b''.join(self._fragments(codec))
+
+    def _fragments(self, codec=None):
+        """Stream data as a tuple of bytes-like objects, not concatenated."""
+        extra, stream = self._dictionary_and_stream(codec)
+        return (extra.data, b'\nstream\n', stream, b'\nendstream')
+
+    def _dictionary_and_stream(self, codec=None):
+        """Stream dictionary and stream data, compressed if needed."""
         extra = Dictionary(self.extra.copy())
+        if isinstance(self.stream, _DeflatedContent):
+            stream = self.stream.getvalue()
+        else:
+            if isinstance(self.stream, _Content):
+                stream = self.stream.getvalue()
+            else:
+                stream = b'\n'.join(_to_bytes(item) for item in self.stream)
+            if self.compress:
+                codec = self.codec or codec or _DEFAULT_CODEC
+                stream = codec.compress(stream)
         if self.compress:
             extra['Filter'] = '/FlateDecode'
-            compressobj = zlib.compressobj(level=9)
-            stream = compressobj.compress(stream)
-            stream += compressobj.flush()
         extra['Length'] = len(stream)
-        return b'\n'.join((extra.data, b'stream', stream, b'endstream'))
+        return extra, stream
+
+
+class Image(Stream):
+    """PDF image XObject, compressed with a PNG predictor.
+
+    Pixels are filtered and compressed by strips of rows when the image is
+    created, only the compressed data is kept.
+
+    :param pixels: Pixels of the image, as a NumPy array of unsigned 8-bit or
+      16-bit integers with one row of pixels per line, or as an iterable of
+      bytes-like rows.
+    :param int width: Width of the image, in pixels. Required when pixels are
+      given as rows.
+    :param int height: Height of the image, in pixels. Default is the number
+      of rows.
+    :param str color_space: Color space of the image, ``'Gray'``, ``'RGB'`` or
+      ``'CMYK'``. Default is given by the shape of NumPy arrays, or
+      ``'RGB'``.
+    :param int bits_per_component: Bits per component, ignored for NumPy
+      arrays.
+    :param str predictor: PNG predictor, ``'up'``, ``'paeth'``, or
+      :obj:`None` to compress the pixels without predictor.
+    :param dict extra: Extra metadata of the image.
+    :param codec: :class:`Codec` used to compress the image. Default is a
+      default codec.
+
+    """
+    __slots__ = ()
+
+    def __init__(self, pixels, width=None, height=None, color_space=None,
+                 bits_per_component=8, predictor='paeth', extra=None,
+                 codec=None):
+        if predictor is not None and predictor not in _PNG_FILTERS:
+            raise ValueError(f'Unknown predictor: {predictor!r}')
+        if numpy is not None and isinstance(pixels, numpy.ndarray):
+            if pixels.dtype not in (numpy.uint8, numpy.uint16):
+                raise ValueError('Pixels must be 8 or 16-bit integers.')
+            bits_per_component = pixels.dtype.itemsize * 8
+            if pixels.ndim == 2:
+                pixels = pixels[..., None]
+            components = pixels.shape[2]
+            color_space = color_space or _IMAGE_COLOR_SPACES.get(components)
+            width = width or pixels.shape[1]
+            if pixels.shape[1] != width:
+                raise ValueError('Pixels don’t match the width of the image.')
+            pixels = pixels.astype(pixels.dtype.newbyteorder('>'), copy=False)
+            rows_per_strip = max(1, _IMAGE_STRIP_SIZE // pixels[0].nbytes)
+            strips = (
+                pixels[i:i + rows_per_strip].tobytes()
+                for i in range(0, len(pixels), rows_per_strip))
+        else:
+            if width is None:
+                raise ValueError('Width is required when pixels are rows.')
+            color_space = color_space or 'RGB'
+            components = _IMAGE_COMPONENTS.get(color_space)
+            strips = None
+        if components is None or (
+                _IMAGE_COMPONENTS.get(color_space) != components):
+            raise ValueError(f'Invalid color space: {color_space!r}')
+        columns = ceil(width * components * bits_per_component / 8)
+        if strips is None:
+            strips = _strips(pixels, columns)
+
+        filter_type = _PNG_FILTERS.get(predictor)
+        bytes_per_pixel = max(1, components * bits_per_component // 8)
+        compressobj = (codec or _DEFAULT_CODEC).compressobj()
+        chunks, previous, rows = [], bytes(columns), 0
+        for strip in strips:
+            rows += len(strip) // columns
+            if filter_type:
+                strip, previous = _predict(
+                    strip, columns, bytes_per_pixel, filter_type,
+                    previous), strip[-columns:]
+            chunks.append(compressobj.compress(strip))
+        chunks.append(compressobj.flush())
+        if height is not None and height != rows:
+            raise ValueError('Pixels don’t match the height of the image.')
+
+        image_extra = {
+            'Type': '/XObject',
+            'Subtype': '/Image',
+            'Width': width,
+            'Height': rows,
+            'ColorSpace': f'/Device{color_space}',
+            'BitsPerComponent': bits_per_component,
+            'Filter': '/FlateDecode',
+        }
+        if filter_type:
+            image_extra['DecodeParms'] = Dictionary({
+                'Predictor': 15,
+                'Colors': components,
+                'BitsPerComponent': bits_per_component,
+                'Columns': width,
+            })
+        image_extra.update(extra or {})
+        super().__init__(
+            (b''.join(chunks),), Dictionary(image_extra), codec=codec)
+
+
+def _strips(rows, columns):
+    """Group rows of ``columns`` bytes into strips of bytes."""
+    rows_per_strip = max(1, _IMAGE_STRIP_SIZE // columns)
+    strip = []
+    for row in rows:
+        if len(row) != columns:
+            raise ValueError('Pixels don’t match the width of the image.')
+        strip.append(row)
+        if len(strip) == rows_per_strip:
+            yield b''.join(strip)
+            strip = []
+    if strip:
+        yield b''.join(strip)
+
+
+def _predict(data, columns, bytes_per_pixel, filter_type, previous):
+    """Filter rows of ``columns`` bytes with a PNG predictor.
+
+    ``previous`` is the row preceding ``data``. Each filtered row is preceded
+    by its ``filter_type`` byte.
+
+    """
+    if numpy is not None:
+        rows = numpy.frombuffer(data, numpy.uint8).reshape(-1, columns)
+        up = numpy.empty_like(rows)
+        up[0] = numpy.frombuffer(previous, numpy.uint8)
+        up[1:] = rows[:-1]
+        if filter_type == _PNG_FILTERS['up']:
+            predicted = up
+        else:
+            left = numpy.zeros_like(rows)
+            left[:, bytes_per_pixel:] = rows[:, :-bytes_per_pixel]
+            up_left = numpy.zeros_like(rows)
+            up_left[:, bytes_per_pixel:] = up[:, :-bytes_per_pixel]
+            a, b, c = (
+                array.astype(numpy.int16) for array in (left, up, up_left))
+            distance_a, distance_b = numpy.abs(b - c), numpy.abs(a - c)
+            distance_c = numpy.abs(a + b - 2 * c)
+            predicted = numpy.where(
+                (distance_a <= distance_b) & (distance_a <= distance_c), left,
+                numpy.where(distance_b <= distance_c, up, up_left))
+        filtered = numpy.empty((len(rows), columns + 1), numpy.uint8)
+        filtered[:, 0] = filter_type
+        numpy.subtract(rows, predicted, out=filtered[:, 1:])
+        return filtered.tobytes()
+
+    if filter_type == _PNG_FILTERS['up']:
+        # Subtract all the previous rows at once
+        difference = _subtract_bytes(data, (previous + data)[:len(data)])
+        return _interleave(filter_type, difference, columns)
+
+    filtered = bytearray()
+    for start in range(0, len(data), columns):
+        row = data[start:start + columns]
+        filtered.append(filter_type)
+        for i, x in enumerate(row):
+            b = previous[i]
+            if i < bytes_per_pixel:
+                filtered.append((x - b) & 255)
+                continue
+            a, c = row[i - bytes_per_pixel], previous[i - bytes_per_pixel]
+            distance_a, distance_b = abs(b - c), abs(a - c)
+            distance_c = abs(a + b - 2 * c)
+            if distance_a <= distance_b and distance_a <= distance_c:
+                filtered.append((x - a) & 255)
+            elif distance_b <= distance_c:
+                filtered.append((x - b) & 255)
+            else:
+                filtered.append((x - c) & 255)
+        previous = row
+    return bytes(filtered)
+
+
+def _subtract_bytes(data, other):
+    """Subtract bytes of ``other`` from bytes of ``data``, modulo 256.
+
+    Bytes are handled as big integers. The highest bit of each byte is set in
+    ``data`` and unset in ``other``, so that subtractions never borrow from
+    the next bytes, and fixed afterwards.
+
+    """
+    high = int.from_bytes(b'\x80' * len(data), 'big')
+    x, y = int.from_bytes(data, 'big'), int.from_bytes(other, 'big')
+    difference = ((x | high) - (y & ~high)) ^ ((x ^ ~y) & high)
+    return difference.to_bytes(len(data), 'big')
+
+
+def _interleave(byte, data, columns):
+    """Get rows of ``columns`` bytes from ``data``, each preceded by byte."""
+    rows = len(data) // columns
+    interleaved = bytearray(rows * (columns + 1))
+    interleaved[::columns + 1] = bytes((byte,)) * rows
+    for i in range(columns):
+        interleaved[i + 1::columns + 1] = data[i::columns]
+    return bytes(interleaved)
+
+
+# "A literal string is written as an arbitrary number of characters enclosed
+# in parentheses. Any characters may appear in a string except unbalanced
+# parentheses and the backslash, which must be treated specially."
+_ESCAPES = str.maketrans({'\\': '\\\\', '(': '\\(', ')': '\\)'})
+
+# Translation of Unicode characters into PDFDocEncoding, including escapes.
+# Latin-1 characters not available in PDFDocEncoding are replaced by a
+# character out of Latin-1, so that these strings are encoded in UTF-16.
+_PDFDOC = {
+    **dict.fromkeys(
+        (*range(0x00, 0x09), 0x0b, 0x0c, *range(0x0e, 0x20),
+         *range(0x7f, 0xa1), 0xad), '\u0100'),
+    **{ord(character): chr(0x18 + i) for i, character in enumerate(
+        '\u02d8\u02c7\u02c6\u02d9\u02dd\u02db\u02da\u02dc')},
+    **{ord(character): chr(0x80 + i) for i, character in enumerate(
+        '\u2022\u2020\u2021\u2026\u2014\u2013\u0192\u2044\u2039\u203a'
+        '\u2212\u2030\u201e\u201c\u201d\u2018\u2019\u201a\u2122\ufb01'
+        '\ufb02\u0141\u0152\u0160\u0178\u017d\u0131\u0142\u0153\u0161'
+        '\u017e')},
+    0x20ac: '\xa0',
+    **_ESCAPES,
+}
+
+
+# Latin-1 characters with the same code in PDFDocEncoding
+_LATIN1 = bytes((0x09, 0x0a, 0x0d, *range(0x20, 0x7f), *range(0xa1, 0x100)))
+_LATIN1 = _LATIN1.replace(b'\xad', b'')
+
+
+def _escape(string):
+    """Escape bytes and enclose them in parentheses."""
+    escaped = string.replace(b'\\', b'\\\\')
+    return b'(' + escaped.replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def _encode_string(string):
+    """Encode string as a literal string, or as a UTF-16 hexadecimal string."""
+    if isinstance(string, bytes):
+        return _escape(string)
+    string = str(string)
+    if string.isascii():
+        return b'(' + string.translate(_ESCAPES).encode('ascii') + b')'
+    if max(string) < '\u0100':
+        encoded = string.encode('latin-1')
+        if not encoded.translate(None, _LATIN1):
+            return _escape(encoded)
+    translated = string.translate(_PDFDOC)
+    if max(translated) < '\u0100':
+        return b'(' + translated.encode('latin-1') + b')'
+    encoded = BOM_UTF16_BE + string.encode('utf-16-be')
+    return b'<' + encoded.hex().encode() + b'>'
+
+
+_string_encoder = _encode_string
+
+
+def set_string_cache_size(size):
+    """Cache the encoding of the most recently used strings.
+
+    Caching is useful for documents repeating the same strings many times, in
+    headers, labels or table cells for example.
+
+    :param int size: Maximum number of cached strings. Caching is disabled when
+      size is ``0``, the default.
+
+    """
+    global _string_encoder
+    _string_encoder = (
+        lru_cache(size, typed=True)(_encode_string) if size
+        else _encode_string)
 
 
 class String(Object):
-    """PDF String object."""
+    """PDF String object.
+
+    Strings are encoded using PDFDocEncoding when possible, and UTF-16
+    otherwise.
+
+    """
+    __slots__ = (*_OBJECT_SLOTS, 'string')
+
     def __init__(self, string=''):
         super().__init__()
         #: Unicode string.
@@ -421,33 +1226,428 @@ class String(Object):
 
     @property
     def data(self):
-        try:
-            # "A literal string is written as an arbitrary number of characters
-            # enclosed in parentheses. Any characters may appear in a string
-            # except unbalanced parentheses and the backslash, which must be
-            # treated specially."
-            escaped = re.sub(rb'([\\\(\)])', rb'\\\1', _to_bytes(self.string))
-            return b'(' + escaped + b')'
-        except UnicodeEncodeError:
-            encoded = BOM_UTF16_BE + str(self.string).encode('utf-16-be')
-            return b'<' + encoded.hex().encode() + b'>'
+        return _string_encoder(self.string)
 
 
 class Array(Object, list):
     """PDF Array object."""
+    __slots__ = _OBJECT_SLOTS
+
     def __init__(self, array=None):
         Object.__init__(self)
         list.__init__(self, array or [])
 
     @property
     def data(self):
-        return b'[' + b' '.join(_to_bytes(child) for child in self) + b']'
+        return bytes(_write_item(self, bytearray()))
+
+
+def _write_item(item, output, memo=None, references=None):
+    """Write serialized item into output, and return output.
+
+    Nested dictionaries and arrays are walked iteratively, without recursion.
+
+    When ``memo`` is given, the data of nested dictionaries and arrays found
+    more than once is stored in ``memo`` by id, and reused when these objects
+    are found again. Objects must not be modified while ``memo`` is used.
+
+    When ``references`` is given, ``(start, end, number)`` tuples are appended
+    to ``references`` for each referenced object number written in output.
+    References are found in strings and bytes, including references included
+    in other syntax such as ``b'[N G R]'``, and in ``N, G, 'R'`` items of
+    arrays.
+
+    """
+    # Stack of (children, dictionary, end, container, start) tuples
+    if type(item) is Dictionary:
+        stack = [(iter(item.items()), True, b'>>', item, len(output))]
+        output += b'<<'
+    elif type(item) is Array:
+        stack = [(iter(enumerate(item)), False, b']', item, len(output))]
+        output += b'['
+    else:
+        output += _to_bytes(item)
+        return output
+    while stack:
+        children, dictionary, end, container, start = stack[-1]
+        for key, item in children:
+            if dictionary:
+                key = key.encode('ascii') if type(key) is str else (
+                    _to_bytes(key))
+                output += b'/' + key + b' '
+            elif key:
+                output += b' '
+            cls = type(item)
+            if cls is str:
+                item, cls = item.encode('ascii'), bytes
+            if cls is bytes:
+                if references is not None:
+                    position = len(output)
+                    for match in _REFERENCE.finditer(item):
+                        references.append((
+                            position + match.start(1), position + match.end(1),
+                            int(match[1])))
+                output += item
+            elif cls is int:
+                string = (_INTEGERS.get(item) or str(item)).encode('ascii')
+                if references is not None and not dictionary:
+                    following = container[key + 1:key + 3]
+                    if (len(following) == 2 and
+                            type(following[0]) is int and
+                            type(following[1]) in (str, bytes) and
+                            following[1] in ('R', b'R')):
+                        position = len(output)
+                        references.append(
+                            (position, position + len(string), item))
+                output += string
+            elif cls is not Dictionary and cls is not Array:
+                output += _to_bytes(item)
+            elif memo is not None and (
+                    cached := memo.get(id(item))) and cached[1] is not None:
+                output += cached[1]
+            else:
+                # Serialize children of nested dictionary or array
+                if cls is Dictionary:
+                    children, dictionary, end = iter(item.items()), True, b'>>'
+                else:
+                    children, dictionary, end = (
+                        iter(enumerate(item)), False, b']')
+                stack.append((children, dictionary, end, item, len(output)))
+                output += b'<<' if dictionary else b'['
+                break
+        else:
+            # Close finished dictionary or array
+            stack.pop()
+            output += end
+            if memo is not None and stack:
+                # Only keep data of objects found twice, as copying data of
+                # all the objects is quadratic for deeply nested objects
+                if id(container) in memo:
+                    memo[id(container)] = (container, bytes(output[start:]))
+                else:
+                    memo[id(container)] = (container, None)
+    return output
+
+
+def _reference_parts(item, parts):
+    """Append serialized item to parts, with referenced numbers as integers."""
+    output, references, position = bytearray(), [], 0
+    _write_item(item, output, references=references)
+    for start, end, number in references:
+        parts.append(bytes(output[position:start]))
+        parts.append(number)
+        position = end
+    parts.append(bytes(output[position:]))
+
+
+def _object_parts(object_, codec=None):
+    """Serialize object into parts, with referenced numbers as integers.
+
+    Streams with no codec are compressed with ``codec``.
+
+    """
+    parts = []
+    if isinstance(object_, Stream):
+        extra, stream = object_._dictionary_and_stream(codec)
+        _reference_parts(extra, parts)
+        parts.extend((b'\nstream\n', stream, b'\nendstream'))
+    else:
+        _reference_parts(object_, parts)
+    return parts
+
+
+class _SerializedObject(Object):
+    """Object whose data has already been serialized into fragments."""
+    __slots__ = (*_OBJECT_SLOTS, '_fragments', '_stream')
+
+    def __init__(self, fragments, stream=False):
+        super().__init__()
+        self._fragments = fragments
+        self._stream = stream
+
+    @property
+    def data(self):
+        return b''.join(self._fragments)
+
+    @property
+    def compressible(self):
+        return not self.generation and not self._stream
+
+
+class FrozenObject(Object):
+    """Immutable object, serialized and compressed once.
+
+    Frozen objects created from other frozen objects share their data, and
+    can be added to different documents with different numbers. Frozen
+    objects must not include references to other objects.
+
+    """
+    __slots__ = (*_OBJECT_SLOTS, '_fragments', '_stream')
+
+    def __init__(self, object_, codec=None):
+        """Freeze an object.
+
+        :param object_: Object to freeze.
+        :type object_: :class:`Object`
+        :param codec: Codec used to compress streams that have no codec.
+          Default is a default codec.
+        :type codec: :class:`Codec`
+
+        """
+        super().__init__()
+        if isinstance(object_, FrozenObject):
+            self._fragments = object_._fragments
+            self._stream = object_._stream
+        elif isinstance(object_, Stream):
+            self._fragments = tuple(
+                bytes(fragment) for fragment in object_._fragments(codec))
+            self._stream = True
+        else:
+            self._fragments = (bytes(object_.data),)
+            self._stream = False
+
+    @property
+    def data(self):
+        return b''.join(self._fragments)
+
+    @property
+    def compressible(self):
+        return not self.generation and not self._stream
+
+    @property
+    def size(self):
+        """Size in bytes of the object data."""
+        return sum(map(len, self._fragments))
+
+
+# Cache of frozen objects, with the size and the maximum size of their data
+_FROZEN_OBJECTS = OrderedDict()
+_FROZEN_OBJECTS_LOCK = Lock()
+_frozen_objects_size = 0
+_frozen_cache_size = 64 << 20
+
+
+def frozen_object(key, factory, codec=None):
+    """Get frozen object from the process-wide cache of frozen objects.
+
+    Cached objects can be frozen when worker processes or threads start, and
+    then shared by all the documents they generate.
+
+    :param key: Hashable key of the object in the cache.
+    :param factory: Function called without arguments to create the object
+      when it is not cached.
+    :param codec: Codec used to compress streams that have no codec.
+    :type codec: :class:`Codec`
+    :return: New :class:`FrozenObject` sharing the data of the cached object.
+
+    """
+    global _frozen_objects_size
+    with _FROZEN_OBJECTS_LOCK:
+        frozen = _FROZEN_OBJECTS.get(key)
+        if frozen is not None:
+            _FROZEN_OBJECTS.move_to_end(key)
+    if frozen is None:
+        frozen = FrozenObject(factory(), codec)
+        with _FROZEN_OBJECTS_LOCK:
+            if key not in _FROZEN_OBJECTS:
+                _FROZEN_OBJECTS[key] = frozen
+                _frozen_objects_size += frozen.size
+                _evict_frozen_objects()
+    return FrozenObject(frozen)
+
+
+def set_frozen_cache_size(size):
+    """Set the maximum size of the cache of frozen objects.
+
+    Least recently used objects are removed from the cache when its size is
+    exceeded.
+
+    :param int size: Maximum total size in bytes of the cached objects.
+      Default is 64 MiB, caching is disabled when size is ``0``.
+
+    """
+    global _frozen_cache_size
+    with _FROZEN_OBJECTS_LOCK:
+        _frozen_cache_size = size
+        _evict_frozen_objects()
+
+
+def _evict_frozen_objects():
+    """Remove least recently used objects until cache size is not exceeded."""
+    global _frozen_objects_size
+    while _FROZEN_OBJECTS and _frozen_objects_size > _frozen_cache_size:
+        _, frozen = _FROZEN_OBJECTS.popitem(last=False)
+        _frozen_objects_size -= frozen.size
+
+
+class Fragment:
+    """Part of a PDF document, built separately.
+
+    Fragments can be built in other processes, and then added to their
+    document with :meth:`PDF.add_fragment`. Their objects are serialized when
+    fragments are pickled, and renumbered when fragments are added.
+
+    """
+    def __init__(self, size, codec=None):
+        """Create a PDF fragment.
+
+        :param int size: Number of objects in the document when the fragment
+          is created. Objects of the document with lower numbers, including
+          :attr:`PDF.pages`, can be referenced by the fragment objects.
+        :param codec: Codec used to compress the streams that have no codec.
+        :type codec: :class:`Codec`
+
+        """
+        #: Number of objects in the document when the fragment is created.
+        self.size = size
+        #: :class:`Codec` used to compress the streams that have no codec.
+        self.codec = codec
+        #: Python :obj:`list` containing the fragment’s objects.
+        self.objects = []
+        #: Python :obj:`list` containing the fragment’s page numbers.
+        self.page_numbers = []
+        # Serialized objects, set when the fragment is unpickled
+        self._serialized = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['objects'] = []
+        state['_serialized'] = self._serialize()
+        return state
+
+    def _serialize(self):
+        """Get list of serialized objects.
+
+        Serialized objects are ``(parts, stream)`` tuples, where ``parts`` is
+        a list of bytes and of referenced object numbers.
+
+        """
+        if self._serialized is not None:
+            return self._serialized
+        return [
+            (_object_parts(object_, self.codec), not object_.compressible)
+            for object_ in self.objects]
+
+    def add_object(self, object_):
+        """Add object to the fragment."""
+        object_.number = self.size + len(self.objects)
+        self.objects.append(object_)
+
+    def add_page(self, page):
+        """Add page to the fragment.
+
+        :param page: New page.
+        :type page: :class:`Dictionary`
+
+        """
+        self.add_object(page)
+        self.page_numbers.append(page.number)
+
+
+class _PageReferences(Sequence):
+    """Sequence of page references, computed from the page tree kids."""
+    def __init__(self, pages):
+        self._pages = pages
+
+    def __len__(self):
+        return len(self._pages['Kids']) // 3
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self[i] for i in range(*index.indices(len(self))))
+        elif index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('Page index out of range.')
+        return f'{self._pages["Kids"][3 * index]} 0 R'.encode('ascii')
+
+    def __eq__(self, other):
+        return isinstance(other, Sequence) and tuple(self) == tuple(other)
+
+
+class _FlushedObject(Object):
+    """Object already written, only kept for its number in the PDF."""
+    __slots__ = _OBJECT_SLOTS
+    compressible = False
+
+
+# Placeholder of the objects written in streaming mode
+_FLUSHED_OBJECT = _FlushedObject()
+
+
+class _OriginalObject(_FlushedObject):
+    """Object of the original PDF, not included in updates."""
+    __slots__ = ()
+
+
+def _pack_fields(fields, widths):
+    """Pack arrays of integers into rows of big-endian fields.
+
+    The fields of each row have given widths in bytes. Fields are copied byte
+    by byte from the big-endian representations of all their values, so that
+    integers are never converted one by one.
+
+    """
+    length = sum(widths)
+    packed = bytearray(length * len(fields[0]))
+    position = 0
+    for values, width in zip(fields, widths):
+        values = array('Q', values)
+        if byteorder == 'little':
+            values.byteswap()
+        values = values.tobytes()
+        for i in range(width):
+            packed[position + i::length] = values[8 - width + i::8]
+        position += width
+    return bytes(packed)
+
+
+@lru_cache(maxsize=1)
+def _digits():
+    """Get NumPy table of the 5 ASCII digits of numbers lower than 100000."""
+    numbers = numpy.arange(100000, dtype=numpy.uint32)[:, numpy.newaxis]
+    powers = 10 ** numpy.arange(4, -1, -1, dtype=numpy.uint32)
+    return (numbers // powers % 10 + ord('0')).astype(numpy.uint8)
+
+
+def _format_xref_table(types, offsets, generations):
+    """Format cross-reference table entries from arrays of fields."""
+    if numpy is None:
+        values = zip(offsets, generations, map(b'fn'.__getitem__, types))
+        return b'%010d %05d %c \n' * len(types) % tuple(chain(*values))
+
+    # Fill entries with digits of 5-digit parts of fields
+    digits, offsets = _digits(), numpy.frombuffer(offsets, numpy.uint64)
+    entries = numpy.empty((len(types), 20), numpy.uint8)
+    entries[:, 0:5] = digits[offsets // 100000]
+    entries[:, 5:10] = digits[offsets % 100000]
+    entries[:, 11:16] = digits[numpy.frombuffer(generations, numpy.uint64)]
+    entries[:, 17] = numpy.frombuffer(b'fn', numpy.uint8)[
+        numpy.frombuffer(types, numpy.uint8)]
+    entries[:, (10, 16, 18)] = ord(' ')
+    entries[:, 19] = ord('\n')
+    return entries.tobytes()
 
 
 class PDF:
     """PDF document."""
-    def __init__(self):
-        """Create a PDF document."""
+    def __init__(self, codec=None, digest=md5):
+        """Create a PDF document.
+
+        :param codec: Codec used to compress the streams that have no codec.
+        :type codec: :class:`Codec`
+        :param digest: Function creating the hash object used to generate
+          file identifiers, such as :func:`hashlib.md5` or
+          :func:`hashlib.blake2b`. Default is :func:`hashlib.md5`.
+
+        """
+        #: :class:`Codec` used to compress the streams that have no codec.
+        self.codec = codec
+        #: Function creating the hash object used to generate identifiers.
+        self.digest = digest
+
+        # Output and version of streamed PDF, and hash of written objects
+        self._output = self._version = self._digest = None
 
         #: Python :obj:`list` containing the PDF’s objects.
         self.objects = []
@@ -475,32 +1675,488 @@ class PDF:
         })
         self.add_object(self.catalog)
 
+        #: Python :obj:`dict` containing the resources added with
+        #: :meth:`add_resource`, as :class:`Dictionary` objects associating
+        #: resource names to references, by category.
+        self.resources = {}
+        # Names of the resources, by category and data or id
+        self._resource_names = {}
+
         #: Current position in the PDF.
         self.current_position = 0
         #: Position of the cross reference table.
         self.xref_position = None
 
-    def add_page(self, page):
+        # Data of the objects, serialized before being written
+        self._serialized = {}
+        # Data of nested objects, serialized once during each write
+        self._memo = None
+        # Position of the previous cross-reference section, for updates
+        self._previous_xref_position = None
+
+        # Offsets, generations and used resources of objects written in
+        # streaming mode, by number
+        self._flushed_offsets = array('Q')
+        self._flushed_generations = array('H')
+        self._flushed_resources = {}
+        # Pages getting the resources used by their contents when written
+        self._resources_pages = []
+
+    def begin(self, output, version=b'1.7'):
+        """Write PDF header to output, and stream the following objects.
+
+        Objects added after this call are written as soon as they are added,
+        and only their number, offset and generation are kept. Other objects,
+        including the page tree, the catalog and the metadata, are written by
+        :meth:`write`, that has to be called with the same output.
+
+        :param output: Output stream.
+        :type output: binary :term:`file object`
+        :param bytes version: PDF version.
+
+        """
+        self._version = _to_bytes(version or b'1.7')  # Force 1.7 when None
+        self._output = output
+        self._digest = self.digest()
+        self._write_header(self._version, output)
+
+    def add_page(self, page, flush=True):
         """Add page to the PDF.
 
         :param page: New page.
         :type page: :class:`Dictionary`
+        :param bool flush: Whether the page is written immediately when the
+          PDF is streamed.
 
         """
         self.pages['Count'] += 1
-        self.add_object(page)
+        if 'Resources' not in page:
+            if flush and self._output is not None:
+                if self.resources:
+                    page['Resources'] = self._page_resources(page)
+            else:
+                self._resources_pages.append(page)
+        self.add_object(page, flush)
         self.pages['Kids'].extend([page.number, 0, 'R'])
 
-    def add_object(self, object_):
-        """Add object to the PDF."""
+    def add_resource(self, category, resource):
+        """Add resource shared by pages, and get its name.
+
+        Identical dictionaries and arrays are only added once, and get the
+        same name. Pages added with :meth:`add_page` with no resources get the
+        resources used by their content streams when the PDF is written, or
+        when the page is added if it is immediately written in streaming mode.
+
+        :param str category: Category of the resource, such as
+          ``'ExtGState'``, ``'ColorSpace'``, ``'Pattern'``, ``'Shading'``,
+          ``'XObject'`` or ``'Font'``.
+        :param resource: Resource, added to the PDF if it has not been added
+          yet.
+        :type resource: :class:`Object`, :obj:`dict` or :obj:`list`
+        :return: Name of the resource, to use in content streams.
+
+        """
+        if isinstance(resource, dict) and not isinstance(resource, Object):
+            resource = Dictionary(resource)
+        elif isinstance(resource, list) and not isinstance(resource, Object):
+            resource = Array(resource)
+        if type(resource) in (Dictionary, Array):
+            key = (category, resource.data)
+        else:
+            key = (category, id(resource))
+        name = self._resource_names.get(key)
+        if name is None:
+            if resource.number is None:
+                self.add_object(resource)
+            names = self.resources.setdefault(category, Dictionary())
+            prefix = _RESOURCE_PREFIXES.get(category, 'R')
+            name = self._resource_names[key] = f'{prefix}{len(names)}'
+            names[name] = resource.reference
+        return name
+
+    def _page_resources(self, page):
+        """Get resources used by the content streams of the page."""
+        contents = page.get('Contents', ())
+        if isinstance(contents, bytes):
+            contents = (contents,)
+        used = set()
+        for reference in contents:
+            match = _REFERENCE.fullmatch(_to_bytes(reference))
+            # Streams not added yet are ignored
+            if match and int(match[1]) < len(self.objects):
+                number = int(match[1])
+                stream = self.objects[number]
+                used.update(
+                    getattr(stream, '_used_resources', None) or
+                    self._flushed_resources.pop(number, ()))
+        resources = Dictionary()
+        for category, names in self.resources.items():
+            page_names = Dictionary({
+                name: reference for name, reference in names.items()
+                if (category, name.encode()) in used})
+            if page_names:
+                resources[category] = page_names
+        return resources
+
+    def add_object(self, object_, flush=True):
+        """Add object to the PDF.
+
+        :param bool flush: Whether the object is written immediately when the
+          PDF is streamed. Flushed objects must not be modified anymore.
+
+        """
         object_.number = len(self.objects)
+        if flush and self._output is not None:
+            object_ = self._flush(object_)
         self.objects.append(object_)
 
+    def _flush(self, object_):
+        """Write object to streamed output and get object to keep.
+
+        Offset and generation of the written object are kept by the PDF, and
+        the same placeholder is kept for all the written objects.
+
+        """
+        self._write_object(object_, self._output)
+        number = object_.number
+        if (missing := number + 1 - len(self._flushed_offsets)) > 0:
+            self._flushed_offsets.frombytes(bytes(8 * missing))
+            self._flushed_generations.frombytes(bytes(2 * missing))
+        self._flushed_offsets[number] = object_.offset
+        self._flushed_generations[number] = object_.generation
+        if self.resources and isinstance(object_, Stream):
+            if object_._used_resources:
+                self._flushed_resources[number] = object_._used_resources
+        return _FLUSHED_OBJECT
+
+    def add_fragment(self, fragment):
+        """Add fragment objects and pages to the PDF.
+
+        Fragment objects are renumbered, and references to these objects are
+        updated.
+
+        :param fragment: Fragment built for this document.
+        :type fragment: :class:`Fragment`
+
+        """
+        serialized = fragment._serialize()
+        size, shift = fragment.size, len(self.objects) - fragment.size
+        if size > len(self.objects):
+            raise ValueError('Fragment has been built for another document.')
+        numbers = {}
+        for parts, stream in serialized:
+            data = []
+            for part in parts:
+                if isinstance(part, int):
+                    if part >= size + len(serialized):
+                        raise ValueError(f'Unknown object number: {part}')
+                    if part not in numbers:
+                        numbers[part] = str(
+                            part + shift if part >= size else part).encode()
+                    part = numbers[part]
+                data.append(part)
+            if stream and len(data) > 3:
+                # Keep stream data apart, to avoid copying it
+                fragments = (b''.join(data[:-3]), *data[-3:])
+            else:
+                fragments = (b''.join(data),)
+            self.add_object(_SerializedObject(fragments, stream))
+        for number in fragment.page_numbers:
+            self.pages['Count'] += 1
+            self.pages['Kids'].extend([number + shift, 0, 'R'])
+
     @property
     def page_references(self):
-        return tuple(
-            f'{object_number} 0 R'.encode('ascii')
-            for object_number in self.pages['Kids'][::3])
+        """Sequence of the page references, computed on access."""
+        return _PageReferences(self.pages)
+
+    def _build_page_tree(self, fanout):
+        """Add intermediate nodes to get a balanced page tree.
+
+        Return the original kids of the root node, replaced by the kids of the
+        balanced tree, the original parents of these kids, and the added
+        nodes.
+
+        """
+        if self.pages is None:
+            raise ValueError('Page trees of updates can’t be balanced.')
+        kids = self.pages['Kids']
+        nodes = [self.objects[number] for number in kids[::3]]
+        if not all(type(node) is Dictionary for node in nodes):
+            raise ValueError(
+                'Flushed pages and pages of fragments are not supported '
+                'in balanced page trees.')
+        original_parents = [(node, node.get('Parent')) for node in nodes]
+        added = []
+        while len(nodes) > fanout:
+            # Split nodes into groups whose sizes differ by one at most
+            groups = ceil(len(nodes) / fanout)
+            parents = []
+            for i in range(groups):
+                start = i * len(nodes) // groups
+                end = (i + 1) * len(nodes) // groups
+                parent = Dictionary({
+                    'Type': '/Pages',
+                    'Kids': Array([]),
+                    'Count': 0,
+                })
+                self.add_object(parent, flush=False)
+                added.append(parent)
+                for node in nodes[start:end]:
+                    node['Parent'] = parent.reference
+                    parent['Kids'].extend([node.number, 0, 'R'])
+                    parent['Count'] += (
+                        node['Count'] if node.get('Type') == '/Pages' else 1)
+                parents.append(parent)
+            nodes = parents
+        self.pages['Kids'] = Array([])
+        for node in nodes:
+            node['Parent'] = self.pages.reference
+            self.pages['Kids'].extend([node.number, 0, 'R'])
+        return kids, original_parents, added
+
+    def _restore_page_tree(self, kids, parents, added):
+        """Restore page tree changed by :meth:`_build_page_tree`.
+
+        Added nodes are replaced by free objects.
+
+        """
+        self.pages['Kids'] = kids
+        for node, parent in parents:
+            if parent is None:
+                node.pop('Parent', None)
+            else:
+                node['Parent'] = parent
+        for node in added:
+            free = self.objects[node.number] = Object()
+            free.number, free.generation, free.free = node.number, 65535, 'f'
+
+    def _deduplicate(self):
+        """Merge identical objects, and update references to merged objects.
+
+        Data of serialized objects is stored in ``self._serialized``. Merged
+        objects are replaced by free objects, and returned.
+
+        """
+        # Serialize objects, and find the objects that can be merged
+        all_parts, candidates, kept = {}, [], {self.info.number}
+        for object_ in self.objects:
+            if object_.free == 'f':
+                continue
+            elif isinstance(object_, _SerializedObject):
+                # Objects referenced by fragment objects are never merged
+                kept.update(
+                    int(match[1])
+                    for match in _REFERENCE.finditer(object_.data))
+            elif isinstance(object_, (Dictionary, Array, Stream)):
+                parts = _object_parts(object_, self.codec)
+                all_parts[object_.number] = parts
+                # Objects referenced in forms not found by the serializer,
+                # such as references in other serialized items, are never
+                # merged, stream data excluded
+                if isinstance(object_, Stream):
+                    parts = parts[:-3]
+                kept.update(
+                    int(match[1]) for part in parts if type(part) is bytes
+                    for match in _REFERENCE.finditer(part))
+                if object_.generation:
+                    continue
+                elif isinstance(object_, Dictionary) and object_.get(
+                        'Type') in ('/Catalog', '/Pages', '/Page'):
+                    continue
+                candidates.append(object_.number)
+        candidates = [number for number in candidates if number not in kept]
+
+        # Merge objects with identical data, until references to merged
+        # objects don’t make other objects identical
+        merged, keys, changed = {}, {}, None
+        while changed is None or changed:
+            for number in candidates:
+                parts = all_parts[number]
+                if changed is None or any(
+                        type(part) is int and part in changed
+                        for part in parts):
+                    digest = blake2b()
+                    for part in parts:
+                        if type(part) is int:
+                            part = str(merged.get(part, part)).encode()
+                        digest.update(part)
+                    keys[number] = digest.digest()
+            numbers, changed = {}, set()
+            for number in candidates:
+                if keys[number] in numbers:
+                    merged[number] = numbers[keys[number]]
+                    changed.add(number)
+                else:
+                    numbers[keys[number]] = number
+            candidates = [
+                number for number in candidates if number not in merged]
+            for number, canonical in merged.items():
+                if canonical in merged:
+                    merged[number] = merged[canonical]
+                    changed.add(number)
+
+        # Store data with updated references, replace merged objects
+        for number, parts in all_parts.items():
+            if number not in merged:
+                self._serialized[number] = tuple(
+                    str(merged.get(part, part)).encode()
+                    if type(part) is int else part for part in parts)
+        replaced = []
+        for number in merged:
+            replaced.append(self.objects[number])
+            free = self.objects[number] = Object()
+            free.number, free.generation, free.free = number, 65535, 'f'
+        return replaced
+
+    def _serialize(self, object_):
+        """Serialize object into a tuple of bytes-like fragments.
+
+        The document codec is used for streams.
+
+        """
+        if isinstance(object_, Stream):
+            return object_._fragments(self.codec)
+        elif isinstance(object_, (FrozenObject, _SerializedObject)):
+            return object_._fragments
+        elif type(object_) in (Dictionary, Array):
+            return (bytes(_write_item(object_, bytearray(), self._memo)),)
+        return (object_.data,)
+
+    def _object_data(self, object_):
+        """Get object data, serialized only once during each write."""
+        fragments = self._serialized.get(object_.number)
+        if fragments is None:
+            fragments = self._serialized[object_.number] = (
+                self._serialize(object_))
+        return b''.join(fragments)
+
+    def _serialize_streams(self, executor):
+        """Serialize and compress streams concurrently using ``executor``.
+
+        Incremental streams, already compressed, are serialized when they are
+        written.
+
+        """
+        streams = [
+            object_ for object_ in self.objects
+            if isinstance(object_, Stream) and object_.free != 'f' and
+            not isinstance(object_.stream, _DeflatedContent) and
+            object_.number not in self._serialized]
+        all_data = executor.map(
+            _stream_fragments, streams, [self.codec] * len(streams))
+        for stream, data in zip(streams, all_data):
+            self._serialized[stream.number] = data
+
+    def _add_object_stream(self, objects, object_streams, compress):
+        """Add object stream containing given objects.
+
+        Numbers of the objects are associated in ``object_streams`` with the
+        object stream number and their index in the object stream.
+
+        """
+        stream = [[]]
+        position = 0
+        for object_ in objects:
+            data = b''.join(self._serialized.pop(object_.number))
+            stream.append(data)
+            stream[0].append(object_.number)
+            stream[0].append(position)
+            position += len(data) + 1
+        stream[0] = ' '.join(str(i) for i in stream[0])
+        extra = {
+            'Type': '/ObjStm',
+            'N': len(objects),
+            'First': len(stream[0]) + 1,
+        }
+        object_stream = Stream(stream, extra, compress)
+        self.add_object(object_stream, flush=False)
+        for index, object_ in enumerate(objects):
+            object_streams[object_.number] = (object_stream.number, index)
+
+    def _write_object(self, object_, output):
+        """Write indirect object to output, storing its offset.
+
+        The hash used for the file identifier is updated with object data.
+
+        """
+        fragments = self._serialized.pop(object_.number, None)
+        if fragments is None:
+            fragments = self._serialize(object_)
+        if self._digest is not None:
+            for fragment in fragments:
+                self._digest.update(fragment)
+        object_.offset = self.current_position
+        header = f'{object_.number} {object_.generation} obj\n'.encode()
+        if len(fragments) == 1:
+            # Concatenating small objects is faster than writing fragments
+            self.write_line(header + fragments[0] + b'\nendobj', output)
+        else:
+            self._write_fragments((header, *fragments, b'\nendobj\n'), output)
+
+    def _write_fragments(self, fragments, output):
+        """Write bytes-like fragments to output, without concatenating them."""
+        self.current_position += sum(map(len, fragments))
+        if hasattr(output, 'writelines'):
+            output.writelines(fragments)
+        else:
+            for fragment in fragments:
+                output.write(fragment)
+
+    def _data_hash(self):
+        """Get hash of written objects data, used as file identifier."""
+        return self._digest.hexdigest().encode()
+
+    def _xref_sections(self):
+        """Get cross-references sections, as first numbers and objects."""
+        return [(0, self.objects)]
+
+    def _xref_fields(self, sections, object_streams, fields):
+        """Fill arrays with the fields of cross-reference entries.
+
+        ``fields`` are 3 arrays extended with the types, the offsets (or the
+        object stream numbers) and the generations (or the indexes in object
+        streams) of the objects in ``sections``. ``None`` is yielded between
+        batches of objects.
+
+        """
+        types, offsets, generations = fields
+        firsts, shifts = [], []
+        for first, section in sections:
+            firsts.append(first)
+            shifts.append(len(types) - first)
+            for i in range(0, len(section), _XREF_BATCH_SIZE):
+                batch = section[i:i + _XREF_BATCH_SIZE]
+                numbers = slice(first + i, first + i + len(batch))
+                batch_offsets = [object_.offset for object_ in batch]
+                batch_generations = [object_.generation for object_ in batch]
+
+                # Offset and generation of the shared flushed placeholder are
+                # 0, values of flushed objects are stored in flat arrays
+                flushed_offsets = self._flushed_offsets[numbers]
+                batch_offsets[:len(flushed_offsets)] = map(
+                    add, batch_offsets, flushed_offsets)
+                flushed_generations = self._flushed_generations[numbers]
+                batch_generations[:len(flushed_generations)] = map(
+                    add, batch_generations, flushed_generations)
+
+                types.extend([object_.free != 'f' for object_ in batch])
+                offsets.extend(batch_offsets)
+                generations.extend(batch_generations)
+                yield None
+
+        items = iter(object_streams.items())
+        while batch := tuple(islice(items, _XREF_BATCH_SIZE)):
+            for number, (stream_number, index) in batch:
+                i = number + shifts[bisect_right(firsts, number) - 1]
+                types[i], offsets[i], generations[i] = 2, stream_number, index
+            yield None
+
+    def _write_header(self, version, output):
+        """Write PDF header to output, at the beginning of the file."""
+        self.current_position = 0
+        self.write_line(b'%PDF-' + version, output)
+        self.write_line(b'%\xf0\x9f\x96\xa4', output)
 
     def write_line(self, content, output):
         """Write line to output.
@@ -514,128 +2170,296 @@ class PDF:
         self.current_position += len(content) + 1
         output.write(content + b'\n')
 
-    def write(self, output, version=b'1.7', identifier=False, compress=False):
+    def write(self, output, version=b'1.7', identifier=False, compress=False,
+              executor=None, objects_per_stream=100, bytes_per_stream=None,
+              page_tree_fanout=None, deduplicate=False):
         """Write PDF to output.
 
+        When the PDF is streamed, write the objects that have not been written
+        yet and finish the document.
+
         :param output: Output stream.
         :type output: binary :term:`file object`
-        :param bytes version: PDF version.
+        :param bytes version: PDF version, ignored when the PDF is streamed.
         :param identifier: PDF file identifier. Default is :obj:`False`
           to include no identifier, can be set to :obj:`True` to generate an
           automatic identifier.
         :type identifier: :obj:`bytes` or :obj:`bool`
         :param bool compress: whether the PDF uses a compressed object stream.
+        :param executor: Executor used to serialize and compress streams
+          concurrently, before they are written in object order. Default is
+          :obj:`None` to serialize streams one after the other. Process pools
+          require streams and codecs that can be pickled.
+        :type executor: :class:`concurrent.futures.Executor`
+        :param int objects_per_stream: Maximum number of objects stored in
+          each compressed object stream. Default is 100, :obj:`None` means no
+          limit.
+        :param int bytes_per_stream: Maximum size in bytes of the objects
+          stored in each compressed object stream, before compression. Default
+          is :obj:`None`, meaning no limit. Objects bigger than this size are
+          stored alone in their object stream.
+        :param int page_tree_fanout: Maximum number of kids of the page tree
+          nodes. When set, intermediate nodes are added to get a balanced page
+          tree, and the ``Parent`` of the pages is updated while the PDF is
+          written. Default is :obj:`None`, keeping all the pages as kids of
+          :attr:`pages`. Not supported by updates.
+        :param bool deduplicate: Whether identical dictionaries, arrays and
+          streams are written only once. References to merged objects are
+          updated when they are given by :attr:`Object.reference`. Pages, page
+          tree nodes, catalog and metadata are never merged. Not supported
+          when the PDF is streamed.
 
         """
-        # Convert version and identifier to bytes
-        version = _to_bytes(version or b'1.7')  # Force 1.7 when None
+        for _ in self._write(
+                output, version, identifier, compress, executor,
+                objects_per_stream, bytes_per_stream, page_tree_fanout,
+                deduplicate):
+            pass
+
+    async def write_async(self, writer, version=b'1.7', identifier=False,
+                          compress=False, executor=None,
+                          objects_per_stream=100, bytes_per_stream=None,
+                          page_tree_fanout=None, deduplicate=False):
+        """Write PDF to asynchronous writer, without blocking the event loop.
+
+        Streams are serialized and compressed in an executor. The writer is
+        drained, and other tasks are run, after each stream and at least every
+        few milliseconds.
+
+        :param writer: Output writer.
+        :type writer: :class:`asyncio.StreamWriter`
+        :param executor: Executor used to serialize and compress streams.
+          Default is :obj:`None` to use the default executor of the event
+          loop. Process pools require streams and codecs that can be pickled.
+        :type executor: :class:`concurrent.futures.Executor`
+
+        Objects can't be deduplicated, as finding identical objects requires
+        all the streams to be compressed before writing. Other parameters are
+        the same as for :meth:`write`.
+
+        """
+        if deduplicate:
+            raise ValueError(
+                'Objects written asynchronously can not be deduplicated.')
+        loop = asyncio.get_running_loop()
+        pause_time = loop.time() + _ASYNC_PAUSE_DELAY
+        objects = self._write(
+            writer, version, identifier, compress, None, objects_per_stream,
+            bytes_per_stream, page_tree_fanout, deduplicate)
+        try:
+            for object_ in objects:
+                if isinstance(object_, Stream) and not isinstance(
+                        object_.stream, _DeflatedContent):
+                    if object_.number not in self._serialized:
+                        self._serialized[object_.number] = (
+                            await loop.run_in_executor(
+                                executor, _stream_fragments, object_,
+                                self.codec))
+                elif loop.time() < pause_time:
+                    continue
+                await writer.drain()
+                await asyncio.sleep(0)
+                pause_time = loop.time() + _ASYNC_PAUSE_DELAY
+        finally:
+            # Restore the PDF when the task is cancelled
+            objects.close()
+
+    def _write(self, output, version, identifier, compress, executor,
+               objects_per_stream, bytes_per_stream, page_tree_fanout,
+               deduplicate):
+        """Write PDF to output, and yield objects before writing them.
+
+        Objects can be serialized before being written, by storing their data
+        in ``self._serialized``. :obj:`None` is yielded while object streams
+        and cross-reference tables are built.
+
+        """
+        # Convert identifier to bytes, check streamed output
         if identifier not in (False, True, None):
             identifier = _to_bytes(identifier)
+        if self._output is not None:
+            if output is not self._output:
+                raise ValueError('PDF is streamed to another output.')
+            elif deduplicate:
+                raise ValueError(
+                    'Streamed PDF objects can not be deduplicated.')
+        self._serialized, self._memo = {}, {}
+
+        # Add metadata before writing objects, unless empty or already added
+        if self.info and self.info.number is None:
+            self.add_object(self.info, flush=False)
+
+        # Add resources used by the contents of pages with no resources
+        for page in self._resources_pages:
+            if self.resources and 'Resources' not in page:
+                page['Resources'] = self._page_resources(page)
+        self._resources_pages.clear()
+
+        # Restore page tree, merged objects and state even if writing fails
+        page_tree, merged = None, ()
+        try:
+            # Build balanced page tree, keeping original tree
+            if page_tree_fanout and (
+                    self.pages is None or
+                    self.pages['Count'] > page_tree_fanout):
+                page_tree = self._build_page_tree(page_tree_fanout)
+
+            # Merge identical objects, keeping merged objects
+            if deduplicate:
+                merged = self._deduplicate()
+
+            try:
+                yield from self._write_objects(
+                    output, version, identifier, compress, executor,
+                    objects_per_stream, bytes_per_stream)
+            finally:
+                self._output = self._version = self._digest = None
+        finally:
+            self._serialized, self._memo = {}, None
+            if page_tree is not None:
+                self._restore_page_tree(*page_tree)
+            for object_ in merged:
+                self.objects[object_.number] = object_
+
+    def _write_objects(self, output, version, identifier, compress, executor,
+                       objects_per_stream, bytes_per_stream):
+        """Write header, objects, cross-reference section and trailer.
+
+        :obj:`None` and objects are yielded as by :meth:`_write`.
 
-        # Write header
-        self.write_line(b'%PDF-' + version, output)
-        self.write_line(b'%\xf0\x9f\x96\xa4', output)
+        """
+        if identifier and self._digest is None:
+            self._digest = self.digest()
+
+        # Write header, unless the PDF is streamed
+        if self._output is None:
+            version = _to_bytes(version or b'1.7')  # Force 1.7 when None
+            self._write_header(version, output)
+        else:
+            version = self._version
 
         if version >= b'1.5' and compress:
-            # Store compressed objects for later and write other ones in PDF
-            compressed_objects = []
-            for object_ in self.objects:
-                if object_.free == 'f':
+            # Store compressed objects in object streams
+            objects, other_objects = self.objects[:], []
+            object_streams = {}
+            chunk, chunk_length = [], 0
+            for object_ in objects:
+                if object_.free == 'f' or isinstance(object_, _FlushedObject):
                     continue
-                if object_.compressible:
-                    compressed_objects.append(object_)
-                else:
-                    object_.offset = self.current_position
-                    self.write_line(object_.indirect, output)
-
-            # Write compressed objects in object stream
-            stream = [[]]
-            position = 0
-            for i, object_ in enumerate(compressed_objects):
-                data = object_.data
-                stream.append(data)
-                stream[0].append(object_.number)
-                stream[0].append(position)
-                position += len(data) + 1
-            stream[0] = ' '.join(str(i) for i in stream[0])
-            extra = {
-                'Type': '/ObjStm',
-                'N': len(compressed_objects),
-                'First': len(stream[0]) + 1,
-            }
-            object_stream = Stream(stream, extra, compress)
-            object_stream.offset = self.current_position
-            self.add_object(object_stream)
-            self.write_line(object_stream.indirect, output)
-
-            # Write cross-reference stream
-            xref = []
-            dict_index = 0
-            for object_ in self.objects:
-                if object_.compressible:
-                    xref.append((2, object_stream.number, dict_index))
-                    dict_index += 1
-                else:
-                    xref.append((
-                        bool(object_.number), object_.offset, object_.generation))
-            xref.append((1, self.current_position, 0))
-
+                elif not object_.compressible:
+                    other_objects.append(object_)
+                    continue
+                data = self._object_data(object_)
+                if chunk and (
+                        (objects_per_stream and
+                         len(chunk) >= objects_per_stream) or
+                        (bytes_per_stream and
+                         chunk_length + len(data) > bytes_per_stream)):
+                    self._add_object_stream(chunk, object_streams, compress)
+                    chunk, chunk_length = [], 0
+                    yield None
+                chunk.append(object_)
+                chunk_length += len(data) + 1
+            if chunk:
+                self._add_object_stream(chunk, object_streams, compress)
+            other_objects.extend(self.objects[len(objects):])
+            if executor is not None:
+                self._serialize_streams(executor)
+
+            # Write other objects, then object streams
+            for object_ in other_objects:
+                yield object_
+                self._write_object(object_, output)
+
+            # Write cross-reference stream, including its own entry
+            sections = self._xref_sections()
+            fields = (array('B'), array('Q'), array('Q'))
+            yield from self._xref_fields(sections, object_streams, fields)
+            for values, value in zip(fields, (1, self.current_position, 0)):
+                values.append(value)
             field2_size = ceil(log(self.current_position + 1, 256))
-            max_generation = max(
-                object_.generation for object_ in self.objects)
-            field3_size = ceil(log(
-                max(max_generation, len(compressed_objects)) + 1, 256))
+            field3_size = ceil(log(max(fields[2]) + 1, 256))
             xref_lengths = (1, field2_size, field3_size)
-            xref_stream = b''.join(
-                value.to_bytes(length, 'big')
-                for line in xref for length, value in zip(xref_lengths, line))
+            xref_stream = _pack_fields(fields, xref_lengths)
+
+            # Filter rows with PNG Up predictor, as most bytes of consecutive
+            # entries are equal
+            columns = sum(xref_lengths)
+            xref_stream = _predict(
+                xref_stream, columns, 1, _PNG_FILTERS['up'], bytes(columns))
+
+            # Include cross-reference stream in the last section
+            index = [
+                number for first, section in sections
+                for number in (first, len(section))]
+            if index and sum(index[-2:]) == len(self.objects):
+                index[-1] += 1
+            else:
+                index.extend((len(self.objects), 1))
             extra = {
                 'Type': '/XRef',
-                'Index': Array((0, len(self.objects) + 1)),
+                'Index': Array(index),
                 'W': Array(xref_lengths),
+                'DecodeParms': Dictionary({
+                    'Predictor': 12, 'Columns': columns}),
                 'Size': len(self.objects) + 1,
                 'Root': self.catalog.reference,
-                'Info': self.info.reference,
             }
+            if self.info.number is not None:
+                extra['Info'] = self.info.reference
+            if self._previous_xref_position is not None:
+                extra['Prev'] = self._previous_xref_position
             if identifier:
-                data = b''.join(obj.data for obj in self.objects if obj.free != 'f')
-                data_hash = md5(data).hexdigest().encode()
+                data_hash = self._data_hash()
                 if identifier is True:
                     identifier = data_hash
                 extra['ID'] = Array((String(identifier).data, String(data_hash).data))
             dict_stream = Stream([xref_stream], extra, compress)
-            self.xref_position = dict_stream.offset = self.current_position
-            self.add_object(dict_stream)
-            self.write_line(dict_stream.indirect, output)
+            self.xref_position = self.current_position
+            self.add_object(dict_stream, flush=False)
+            yield dict_stream
+            self._write_object(dict_stream, output)
         else:
             # Write all non-free PDF objects
+            if executor is not None:
+                self._serialize_streams(executor)
             for object_ in self.objects:
                 if object_.free == 'f':
                     continue
-                object_.offset = self.current_position
-                self.write_line(object_.indirect, output)
+                if not isinstance(object_, _FlushedObject):
+                    yield object_
+                    self._write_object(object_, output)
 
             # Write cross-reference table
             self.xref_position = self.current_position
             self.write_line(b'xref', output)
-            self.write_line(f'0 {len(self.objects)}'.encode(), output)
-            for object_ in self.objects:
-                self.write_line(
-                    (f'{object_.offset:010} {object_.generation:05} '
-                     f'{object_.free} ').encode(), output)
+            sections = self._xref_sections()
+            fields = (array('B'), array('Q'), array('Q'))
+            yield from self._xref_fields(sections, {}, fields)
+            start = 0
+            for first, section in sections:
+                self.write_line(f'{first} {len(section)}'.encode(), output)
+                for i in range(start, start + len(section), _XREF_BATCH_SIZE):
+                    entries = slice(
+                        i, min(i + _XREF_BATCH_SIZE, start + len(section)))
+                    table = _format_xref_table(
+                        *(values[entries] for values in fields))
+                    self._write_fragments((table,), output)
+                    yield None
+                start += len(section)
 
             # Write trailer
             self.write_line(b'trailer', output)
             self.write_line(b'<<', output)
             self.write_line(f'/Size {len(self.objects)}'.encode(), output)
             self.write_line(b'/Root ' + self.catalog.reference, output)
-            if self.info:
-                self.add_object(self.info)
+            if self.info.number is not None:
                 self.write_line(b'/Info ' + self.info.reference, output)
+            if self._previous_xref_position is not None:
+                self.write_line(
+                    f'/Prev {self._previous_xref_position}'.encode(), output)
             if identifier:
-                data = b''.join(
-                    obj.data for obj in self.objects if obj.free != 'f')
-                data_hash = md5(data).hexdigest().encode()
+                data_hash = self._data_hash()
                 if identifier is True:
                     identifier = data_hash
                 self.write_line(
@@ -646,3 +2470,447 @@ class PDF:
         self.write_line(b'startxref', output)
         self.write_line(f'{self.xref_position}'.encode(), output)
         self.write_line(b'%%EOF', output)
+
+
+def _stream_fragments(stream, codec):
+    """Serialize stream with ``codec``, in a possibly different process."""
+    return stream._fragments(codec)
+
+
+def _original_trailer(data):
+    """Get the trailer of the last cross-reference section of PDF ``data``.
+
+    Return the version, the cross-reference position, whether it is a
+    cross-reference stream, and the trailer entries as bytes.
+
+    """
+    position = data.rfind(b'startxref')
+    if position == -1:
+        raise ValueError('No cross-reference section found.')
+    xref_position = int(data[position + 9:position + 40].split()[0])
+    if data[xref_position:xref_position + 4] == b'xref':
+        xref_stream = False
+        trailer = data[data.find(b'trailer', xref_position):position]
+    else:
+        xref_stream = True
+        trailer = data[xref_position:data.find(b'stream', xref_position)]
+    entries = dict(_TRAILER_ENTRIES.findall(trailer))
+    if match := _TRAILER_IDENTIFIER.search(trailer):
+        identifier = match[1]
+        if identifier.startswith(b'<'):
+            identifier = bytes.fromhex(identifier[1:-1].decode('ascii'))
+        else:
+            identifier = re.sub(
+                rb'\\(.)', rb'\1', identifier[1:-1], flags=re.S)
+        entries[b'ID'] = identifier
+    return data[5:8], xref_position, xref_stream, entries
+
+
+class Update(PDF):
+    """Incremental update of an existing PDF.
+
+    Only the objects added to the update and the replaced objects of the
+    original PDF are written, followed by a cross-reference section pointing
+    to the previous one. Written data has to be appended to the original PDF.
+
+    Updates have no page tree, pages of the original PDF can be modified by
+    replacing their objects. The identifier of the original PDF is kept, and
+    the update uses a cross-reference stream when the original PDF uses one.
+
+    """
+    def __init__(self, original, codec=None, digest=md5):
+        """Create an incremental update of an existing PDF.
+
+        :param original: Data of the original PDF, generated by :class:`PDF`.
+        :type original: :term:`bytes-like object` or :class:`mmap.mmap`
+        :param codec: Codec used to compress the streams that have no codec.
+        :type codec: :class:`Codec`
+        :param digest: Function creating the hash object used to generate
+          file identifiers.
+
+        """
+        super().__init__(codec, digest)
+        version, xref_position, xref_stream, entries = (
+            _original_trailer(original))
+        size = int(entries[b'Size'])
+
+        #: Python :obj:`list` containing the PDF’s objects. Objects of the
+        #: original PDF are only kept for their numbers.
+        self.objects = [_OriginalObject()] * size
+        self.pages = None
+        self.catalog = self._original_object(entries[b'Root'])
+        if int(entries.get(b'Info', b'0 ').split()[0]) in range(1, size):
+            self.info = self._original_object(entries[b'Info'])
+
+        #: Current position in the PDF, starting at the end of the original
+        #: PDF.
+        self.current_position = len(original)
+
+        # Version, cross-reference type and identifier of the original PDF
+        self._original_version = version
+        self._original_xref_stream = xref_stream
+        self._original_identifier = entries.get(b'ID')
+        self._original_size = size
+        self._previous_xref_position = xref_position
+        # Whether the original PDF ends with a newline
+        self._newline = original[-1:] in (b'\n', b'\r')
+        # Numbers of the replaced objects of the original PDF
+        self._replaced_numbers = set()
+
+    def _original_object(self, reference):
+        """Get object of the original PDF from its reference."""
+        number, generation = reference.split()[:2]
+        object_ = _OriginalObject()
+        object_.number, object_.generation = int(number), int(generation)
+        self.objects[object_.number] = object_
+        return object_
+
+    def replace_object(self, number, object_, flush=True):
+        """Replace an object of the original PDF.
+
+        :param int number: Number of the replaced object.
+        :param object_: New object.
+        :type object_: :class:`Object`
+        :param bool flush: Whether the object is written immediately when the
+          update is streamed.
+
+        """
+        if not 0 < number < self._original_size:
+            raise ValueError(f'No object {number} in the original PDF.')
+        object_.number = number
+        object_.generation = self.objects[number].generation
+        if flush and self._output is not None:
+            object_ = self._flush(object_)
+        self.objects[number] = object_
+        self._replaced_numbers.add(number)
+        if number == self.catalog.number:
+            self.catalog = object_
+        elif number == self.info.number:
+            self.info = object_
+
+    def add_page(self, page, flush=True):
+        raise TypeError(
+            'Pages can’t be added to updates, replace original pages instead.')
+
+    def _xref_sections(self):
+        """Get sections of consecutive replaced or added objects."""
+        numbers = sorted(self._replaced_numbers)
+        numbers.extend(range(self._original_size, len(self.objects)))
+        sections = []
+        for number in numbers:
+            if sections and sections[-1][0] + len(sections[-1][1]) == number:
+                sections[-1][1].append(self.objects[number])
+            else:
+                sections.append((number, [self.objects[number]]))
+        return sections
+
+    def _write_header(self, version, output):
+        """Separate update from original PDF."""
+        if not self._newline:
+            self.write_line(b'', output)
+
+    def _write(self, output, version, identifier, compress, *args):
+        """Write update with the version and identifier of the original PDF."""
+        version = self._original_version
+        compress = compress or self._original_xref_stream
+        if identifier in (False, True) and self._original_identifier:
+            identifier = self._original_identifier
+        yield from super()._write(
+            output, version, identifier, compress, *args)
+
+
+def _unescape(match):
+    """Get character escaped in a literal string."""
+    escape = match[1]
+    if escape[0] in b'01234567':
+        return bytes((int(escape, 8) & 255,))
+    return _LITERAL_ESCAPES.get(escape, escape)
+
+
+def _unpredict(data, columns, bytes_per_pixel):
+    """Get rows of ``columns`` bytes filtered with PNG predictors."""
+    length = columns + 1
+    if numpy is not None and data[::length] == bytes(len(data) // length):
+        return numpy.frombuffer(data, numpy.uint8).reshape(
+            -1, length)[:, 1:].tobytes()
+    if numpy is not None and data[::length] == b'\2' * (len(data) // length):
+        rows = numpy.frombuffer(data, numpy.uint8).reshape(-1, length)
+        return rows[:, 1:].cumsum(axis=0, dtype=numpy.uint8).tobytes()
+    if data[::length] == b'\2' * (len(data) // length):
+        # Add previous rows to each row, doubling the number of added rows at
+        # each step, with bytes handled as big integers
+        size = len(data) // length * columns
+        rows = bytearray(size)
+        for i in range(columns):
+            rows[i::columns] = data[i + 1::length]
+        high = int.from_bytes(b'\x80' * size, 'big')
+        value, shift = int.from_bytes(rows, 'big'), 8 * columns
+        while shift < 8 * size:
+            shifted = value >> shift
+            value = (
+                ((value & ~high) + (shifted & ~high)) ^
+                ((value ^ shifted) & high))
+            shift *= 2
+        return value.to_bytes(size, 'big')
+
+    rows, previous = bytearray(), bytes(columns)
+    for start in range(0, len(data), length):
+        filter_type = data[start]
+        row = bytearray(data[start + 1:start + length])
+        for i in range(columns):
+            a = row[i - bytes_per_pixel] if i >= bytes_per_pixel else 0
+            b = previous[i]
+            c = previous[i - bytes_per_pixel] if i >= bytes_per_pixel else 0
+            if filter_type == 1:
+                row[i] = (row[i] + a) & 255
+            elif filter_type == 2:
+                row[i] = (row[i] + b) & 255
+            elif filter_type == 3:
+                row[i] = (row[i] + (a + b) // 2) & 255
+            elif filter_type == 4:
+                distance_a, distance_b = abs(b - c), abs(a - c)
+                distance_c = abs(a + b - 2 * c)
+                if distance_a <= distance_b and distance_a <= distance_c:
+                    row[i] = (row[i] + a) & 255
+                elif distance_b <= distance_c:
+                    row[i] = (row[i] + b) & 255
+                else:
+                    row[i] = (row[i] + c) & 255
+        rows += row
+        previous = row
+    return bytes(rows)
+
+
+class Reader:
+    """Lazy reader of PDF files generated by :class:`PDF`.
+
+    Files are memory-mapped when they have a file descriptor, and only the
+    trailer and the positions of the cross-reference sections are read when
+    the reader is created. Objects are parsed when they are accessed by their
+    numbers.
+
+    Names are given as :obj:`str`, references and other keywords as
+    :obj:`bytes`, strings as :class:`String` and streams as :class:`Stream`
+    objects keeping their encoded data, so that read objects can be added to
+    other documents.
+
+    """
+    def __init__(self, source):
+        """Open a PDF file.
+
+        :param source: Path of the file, binary :term:`file object` or PDF
+          data.
+        :type source: :term:`path-like object`, binary :term:`file object`,
+          or :term:`bytes-like object`
+
+        """
+        self._file = None
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            #: Data of the PDF, usually a :class:`mmap.mmap` object.
+            self.data = source
+        else:
+            if not hasattr(source, 'read'):
+                source = self._file = open(source, 'rb')
+            try:
+                self.data = mmap.mmap(
+                    source.fileno(), 0, access=mmap.ACCESS_READ)
+            except OSError:
+                # File objects with no file descriptor, such as BytesIO
+                self.data = source.read()
+
+        # Parsed objects and object streams, by number
+        self._objects = {}
+        self._object_streams = {}
+
+        # Cross-reference subsections, from the last one, as tuples of first
+        # number, number of entries, position and row widths of the entries
+        self._sections = []
+        position = self.data.rfind(b'startxref')
+        if position == -1:
+            raise ValueError('No cross-reference section found.')
+        position = int(self.data[position + 9:position + 40].split()[0])
+        #: PDF :class:`Dictionary` containing the trailer of the last
+        #: cross-reference section.
+        self.trailer = None
+        positions = set()
+        while position is not None and position not in positions:
+            positions.add(position)
+            trailer = self._read_xref_section(position)
+            self.trailer = self.trailer or trailer
+            position = trailer.get('Prev')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.trailer['Size']
+
+    def __getitem__(self, number):
+        """Get object from its number."""
+        if number not in self._objects:
+            self._objects[number] = self._read_object(number)
+        return self._objects[number]
+
+    @property
+    def catalog(self):
+        """PDF :class:`Dictionary` containing the catalog."""
+        return self.resolve(self.trailer['Root'])
+
+    def close(self):
+        """Close the file."""
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        if self._file is not None:
+            self._file.close()
+
+    def resolve(self, item):
+        """Get object referenced by ``item``, or ``item`` itself."""
+        if type(item) is bytes and (match := _REFERENCE.fullmatch(item)):
+            return self[int(match[1])]
+        return item
+
+    def _read_xref_section(self, position):
+        """Store cross-reference subsections at position, and get trailer."""
+        data = self.data
+        if data[position:position + 4] != b'xref':
+            # Cross-reference stream
+            stream = self._parse(position, number=None)
+            extra, rows = stream.extra, self._decode(stream)
+            widths = tuple(extra['W'])
+            index = extra.get('Index', (0, extra['Size']))
+            row_position = 0
+            for first, count in zip(index[::2], index[1::2]):
+                self._sections.append(
+                    (first, count, rows, row_position, widths))
+                row_position += count * sum(widths)
+            return extra
+
+        # Cross-reference table, with entries of 20 bytes
+        position += 4
+        while match := _XREF_SUBSECTION.match(data, position):
+            first, count = int(match[1]), int(match[2])
+            self._sections.append((first, count, data, match.end(), None))
+            position = match.end() + 20 * count
+        position = data.find(b'trailer', position) + 7
+        return _parse_value(data, position)[0]
+
+    def _xref_entry(self, number):
+        """Get cross-reference entry of object as a tuple of 3 integers."""
+        for first, count, data, position, widths in self._sections:
+            if not first <= number < first + count:
+                continue
+            if widths is None:
+                position += 20 * (number - first)
+                entry = data[position:position + 18]
+                return (
+                    int(entry[17:18] == b'n'), int(entry[:10]),
+                    int(entry[11:16]))
+            position += sum(widths) * (number - first)
+            fields = []
+            for width in widths:
+                fields.append(
+                    int.from_bytes(data[position:position + width], 'big'))
+                position += width
+            if not widths[0]:
+                fields[0] = 1
+            return tuple(fields)
+        return (0, 0, 0)
+
+    def _read_object(self, number):
+        """Parse object from its number."""
+        type_, field2, field3 = self._xref_entry(number)
+        if type_ == 1:
+            return self._parse(field2, number)
+        elif type_ == 2:
+            if field2 not in self._object_streams:
+                stream = self[field2]
+                data = self._decode(stream)
+                numbers = data[:stream.extra['First']].split()
+                offsets = [
+                    stream.extra['First'] + int(offset)
+                    for offset in numbers[1::2]]
+                self._object_streams[field2] = (data, offsets)
+            data, offsets = self._object_streams[field2]
+            object_ = _parse_value(data, offsets[field3])[0]
+            if isinstance(object_, Object):
+                object_.number = number
+            return object_
+        raise KeyError(f'No object {number} in the PDF.')
+
+    def _parse(self, position, number):
+        """Parse indirect object at position."""
+        match = _OBJECT_HEADER.match(self.data, position)
+        if match is None or (number is not None and int(match[1]) != number):
+            raise ValueError(f'No object {number} at position {position}.')
+        object_, position = _parse_value(self.data, match.end())
+        if isinstance(object_, Dictionary) and (
+                match_stream := _STREAM_KEYWORD.match(self.data, position)):
+            start = match_stream.end()
+            length = self.resolve(object_['Length'])
+            object_ = Stream([self.data[start:start + length]], object_)
+        if isinstance(object_, Object):
+            object_.number, object_.generation = int(match[1]), int(match[2])
+        return object_
+
+    def _decode(self, stream):
+        """Get decoded data of stream compressed by pydyf."""
+        data = stream.stream.getvalue()
+        filter_ = stream.extra.get('Filter')
+        if filter_ in ('/FlateDecode', '/Fl'):
+            data = zlib.decompress(data)
+        elif filter_ is not None:
+            raise ValueError(f'Unsupported stream filter: {filter_}')
+        parameters = stream.extra.get('DecodeParms') or {}
+        if parameters.get('Predictor', 1) >= 10:
+            colors = parameters.get('Colors', 1)
+            bits = parameters.get('BitsPerComponent', 8)
+            columns = ceil(parameters.get('Columns', 1) * colors * bits / 8)
+            data = _unpredict(data, columns, max(1, colors * bits // 8))
+        return bytes(data)
+
+
+def _parse_value(data, position):
+    """Parse direct object in data at position.
+
+    Return the object and the position following it.
+
+    """
+    stack, key = [], None
+    while True:
+        match = _TOKEN.match(data, position)
+        if match is None:
+            raise ValueError(f'Invalid object at position {position}.')
+        position = match.end()
+        kind, token = match.lastgroup, match[match.lastgroup]
+        if kind == 'open':
+            value = Dictionary() if token == b'<<' else Array()
+            stack.append((value, key))
+            key = None
+            continue
+        elif kind == 'close':
+            value, key = stack.pop()
+        elif kind == 'reference':
+            value = b' '.join(token.split())
+        elif kind == 'number':
+            value = float(token) if b'.' in token else int(token)
+        elif kind == 'name':
+            value = token.decode('latin-1')
+        elif kind == 'hexadecimal':
+            value = String(bytes.fromhex(token[1:-1].decode('ascii')))
+        elif kind == 'literal':
+            value = String(_LITERAL_ESCAPE.sub(_unescape, token[1:-1]))
+        else:
+            value = token
+        if not stack:
+            return value, position
+        container = stack[-1][0]
+        if isinstance(container, Array):
+            container.append(value)
+        elif key is None:
+            key = value[1:]
+        else:
+            container[key] = value
+            key = None
@@ -1,5 +1,16 @@
+import asyncio
+import hashlib
 import io
+import pickle
 import re
+import tracemalloc
+import zlib
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from decimal import Decimal
+
+import pytest
 
 import pydyf
 
@@ -735,6 +746,21 @@ def test_custom_identifier():
     ) is not None
 
 
+@pytest.mark.parametrize('compress', (False, True))
+def test_identifier_digest(compress):
+    identifiers = set()
+    for digest in (hashlib.sha256, hashlib.sha256, hashlib.md5):
+        document = pydyf.PDF(digest=digest)
+        document.add_object(pydyf.Dictionary({'Data': 1}))
+        document.write(pdf := io.BytesIO(), identifier=True, compress=compress)
+        identifier = re.search(
+            b'/ID \\[\\((?P<hash>[0-9a-f]+)\\) \\((?P=hash)\\)\\]',
+            pdf.getvalue())['hash']
+        assert len(identifier) == digest().digest_size * 2
+        identifiers.add(identifier)
+    assert len(identifiers) == 2
+
+
 def test_version():
     document = pydyf.PDF()
     pdf = io.BytesIO()
@@ -744,8 +770,857 @@ def test_version():
 
 def test_string_encoding():
     assert pydyf.String('abc').data == b'(abc)'
-    assert pydyf.String('déf').data == b'<feff006400e90066>'
+    assert pydyf.String('déf').data == b'(d\xe9f)'
     assert pydyf.String('♡').data == b'<feff2661>'
     assert pydyf.String('\\abc').data == b'(\\\\abc)'
     assert pydyf.String('abc(').data == b'(abc\\()'
     assert pydyf.String('ab)c').data == b'(ab\\)c)'
+
+
+def test_string_pdfdocencoding():
+    assert pydyf.String('5 €').data == b'(5 \xa0)'
+    assert pydyf.String('• (œ)').data == b'(\x80 \\(\x9c\\))'
+    assert pydyf.String('\xad').data == b'<feff00ad>'
+    assert pydyf.String('é♡').data == b'<feff00e92661>'
+    assert pydyf.String(b'\xff(').data == b'(\xff\\()'
+    assert pydyf.String(42).data == b'(42)'
+
+
+def test_string_cache():
+    pydyf.set_string_cache_size(2)
+    try:
+        assert pydyf.String('déf').data == b'(d\xe9f)'
+        assert pydyf.String('déf').data == b'(d\xe9f)'
+        assert pydyf._string_encoder.cache_info().hits == 1
+        assert pydyf.String(True).data == b'(True)'
+        assert pydyf.String(1.0).data == b'(1.0)'
+    finally:
+        pydyf.set_string_cache_size(0)
+    assert pydyf._string_encoder is pydyf._encode_string
+
+
+def test_serialize_once(monkeypatch):
+    calls = []
+
+    def compressobj(level, strategy):
+        calls.append(level)
+        return zlib.compressobj(level)
+
+    monkeypatch.setitem(pydyf.DEFLATE_BACKENDS, 'counting', compressobj)
+    for compress in (False, True):
+        calls.clear()
+        document = pydyf.PDF()
+        draw = pydyf.Stream(compress=True, codec=pydyf.Codec('counting'))
+        draw.rectangle(2, 2, 5, 6)
+        document.add_object(draw)
+        document.write(io.BytesIO(), identifier=True, compress=compress)
+        assert len(calls) == 1
+
+
+def test_incremental_compress():
+    draw = pydyf.Stream(compress=True)
+    incremental_draw = pydyf.Stream(incremental=True)
+    for stream in (draw, incremental_draw):
+        stream.move_to(2, 2)
+        stream.line_to(2, 5.5)
+        stream.stroke()
+    assert incremental_draw.compress
+    assert b'2 2 m' not in incremental_draw.data
+    assert incremental_draw.data == incremental_draw.data == draw.data
+    with pytest.raises(ValueError):
+        incremental_draw.stroke()
+
+
+def test_empty_stream():
+    draw = pydyf.Stream()
+    incremental_draw = pydyf.Stream(incremental=True)
+    for stream in (draw, incremental_draw):
+        assert not hasattr(stream.stream, '__dict__')
+    assert b'/Length 0' in draw.data
+    assert zlib.decompress(
+        incremental_draw.data.split(b'stream\n')[1][:-4]) == b''
+    assert list(pydyf.Stream(draw.stream).stream) == []
+
+
+def test_codec():
+    draw = pydyf.Stream(compress=True)
+    draw.rectangle(2, 2, 5, 6)
+    document = pydyf.PDF(codec=pydyf.Codec('zlib', level=1))
+    document.add_object(draw)
+    pdf = io.BytesIO()
+    document.write(pdf)
+    assert zlib.compress(b'2 2 5 6 re', 1) in pdf.getvalue()
+
+    for backend in pydyf.DEFLATE_BACKENDS:
+        draw.codec = pydyf.Codec(backend, level=6)
+        incremental = pydyf.Stream(
+            draw.stream, incremental=True, codec=draw.codec)
+        for stream in (draw, incremental):
+            data = stream.data
+            compressed = data[data.index(b'stream\n') + 7:-10]
+            assert zlib.decompress(compressed) == b'2 2 5 6 re'
+
+    with pytest.raises(ValueError):
+        pydyf.Codec('unknown')
+
+
+@pytest.mark.parametrize('compress', (False, True))
+def test_executor(compress):
+    outputs = []
+    for executor in (None, ThreadPoolExecutor(4), ProcessPoolExecutor(2)):
+        document = pydyf.PDF()
+        for i in range(10):
+            draw = pydyf.Stream(compress=True, incremental=bool(i % 2))
+            draw.rectangle(i, i, 5, 6)
+            draw.fill()
+            document.add_object(draw)
+        pdf = io.BytesIO()
+        document.write(
+            pdf, identifier=True, compress=compress, executor=executor)
+        outputs.append(pdf.getvalue())
+        if executor is not None:
+            executor.shutdown()
+    assert outputs[0] == outputs[1] == outputs[2]
+
+
+def _fragment_page(size, pages_reference, font_reference, index):
+    fragment = pydyf.Fragment(size)
+    draw = pydyf.Stream(compress=True)
+    draw.rectangle(index, index, 5, 6)
+    draw.fill()
+    fragment.add_object(draw)
+    fragment.add_page(pydyf.Dictionary({
+        'Type': '/Page',
+        'Parent': pages_reference,
+        'Contents': draw.reference,
+        'Annots': b'[' + draw.reference + b']',
+        'MediaBox': pydyf.Array([0, 0, 10, 10]),
+        'Resources': pydyf.Dictionary({
+            'Font': pydyf.Dictionary({'F1': font_reference}),
+        }),
+    }))
+    return pickle.loads(pickle.dumps(fragment))
+
+
+def test_fragment():
+    document = pydyf.PDF()
+    font = pydyf.Dictionary({'Type': '/Font'})
+    document.add_object(font)
+    size = len(document.objects)
+    fragments = [
+        _fragment_page(size, document.pages.reference, font.reference, i)
+        for i in range(3)]
+    assert not fragments[0].objects
+    document.add_page(pydyf.Dictionary({'Type': '/Page'}))
+    for fragment in fragments:
+        document.add_fragment(fragment)
+
+    assert document.pages['Count'] == 4
+    assert document.page_references[1:] == (b'6 0 R', b'8 0 R', b'10 0 R')
+    data = document.objects[6].data
+    assert b'/Parent 1 0 R' in data
+    assert b'/Contents 5 0 R' in data
+    assert b'/Annots [5 0 R]' in data
+    assert b'/F1 3 0 R' in data
+    assert b'/FlateDecode' in document.objects[5].data
+    fragments = document._serialize(document.objects[5])
+    assert fragments[1::2] == (b'\nstream\n', b'\nendstream')
+    assert zlib.decompress(fragments[2]) == b'0 0 5 6 re\nf'
+    assert document.objects[6].compressible
+    assert not document.objects[5].compressible
+    document.write(io.BytesIO(), compress=True)
+
+    fragment = _fragment_page(size + 10, b'1 0 R', b'3 0 R', 0)
+    with pytest.raises(ValueError):
+        document.add_fragment(fragment)
+
+
+@pytest.mark.parametrize('compress', (False, True))
+def test_begin(compress):
+    document = pydyf.PDF()
+    pdf = io.BytesIO()
+    document.begin(pdf, version=b'1.5')
+    assert pdf.getvalue().startswith(b'%PDF-1.5\n')
+    for i in range(3):
+        draw = pydyf.Stream()
+        draw.rectangle(i, i, 5, 6)
+        draw.fill()
+        document.add_object(draw)
+        document.add_page(pydyf.Dictionary({
+            'Type': '/Page',
+            'Parent': document.pages.reference,
+            'Contents': draw.reference,
+        }))
+        assert f'{i} {i} 5 6 re'.encode() in pdf.getvalue()
+        assert b'/Contents' in pdf.getvalue()
+    font = pydyf.Dictionary({'Type': '/Font'})
+    document.add_object(font, flush=False)
+    font['Subtype'] = '/Type1'
+    assert b'/Font' not in pdf.getvalue()
+    assert not hasattr(document.objects[4], 'stream')
+    with pytest.raises(ValueError):
+        document.write(io.BytesIO())
+    document.write(pdf, identifier=True, compress=compress)
+    assert (b'/Type /Font/Subtype /Type1' in pdf.getvalue()) != compress
+    assert pdf.getvalue().count(b'%PDF') == 1
+    assert pdf.getvalue().count(b'/Type /XRef') == compress
+    assert re.search(b'/ID \\[\\((?P<hash>[0-9a-f]{32})\\)', pdf.getvalue())
+    reader = pydyf.Reader(pdf.getvalue())
+    for number in range(3, 9):
+        assert reader[number].number == number
+
+
+@pytest.mark.parametrize('use_numpy', (False, True))
+@pytest.mark.parametrize('compress', (False, True))
+def test_xref(use_numpy, compress, monkeypatch):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(pydyf, 'numpy', None)
+    document = pydyf.PDF()
+    for i in range(2500):
+        document.add_object(pydyf.Dictionary({'I': i}), flush=i % 2)
+    document.write(output := io.BytesIO(), compress=compress)
+    data = output.getvalue()
+    offsets = {
+        int(match[1]): match.start()
+        for match in re.finditer(rb'(?m)^(\d+) 0 obj', data)}
+
+    if compress:
+        reader = pydyf.Reader(data)
+        xref = reader[len(document.objects) - 1]
+        assert xref.extra['Type'] == '/XRef'
+        columns = sum(xref.extra['W'])
+        assert xref.extra['DecodeParms'] == {
+            'Predictor': 12, 'Columns': columns}
+        rows = reader._decode(xref)
+        assert len(rows) == columns * len(document.objects)
+        for number in (3, 4, 2502):
+            assert reader._xref_entry(number)[0] in (1, 2)
+            assert reader[number]['I'] == number - 3
+        for number, offset in offsets.items():
+            assert reader._xref_entry(number)[:2] == (1, offset)
+    else:
+        table = data[data.index(b'\nxref\n'):data.index(b'trailer')]
+        entries = table.split(b'\n')[3:-1]
+        assert len(entries) == len(document.objects)
+        assert entries[0] == b'0000000000 65535 f '
+        for number, offset in offsets.items():
+            assert entries[number] == b'%010d 00000 n ' % offset
+
+
+def test_precision():
+    draw = pydyf.Stream()
+    draw.move_to(1.23456789, -1e-9)
+    draw.line_to(2.0, 1024)
+    assert bytes(draw.stream) == b'1.234568 0 m\n2 1024 l'
+
+    draw = pydyf.Stream(precision=2)
+    draw.move_to(1.23456789, -0.001)
+    draw.set_dash([1.5, 2.004], 0.25)
+    draw.set_matrix(1, 0, 0, 1, 9.999, 5)
+    draw.set_line_width(0.125)
+    assert bytes(draw.stream) == (
+        b'1.23 0 m\n[1.5 2] 0.25 d\n1 0 0 1 10 5 cm\n0.12 w')
+
+    draw = pydyf.Stream(precision=0)
+    draw.move_to(-55509.51, 3.2)
+    draw.line_to(0.3, 1)
+    draw.line_to(-0.3, 100.5)
+    draw.set_line_width(10.0)
+    draw.polyline([(-0.2, 5.5), (100.5, -0.4)])
+    assert bytes(draw.stream) == (
+        b'-55510 3 m\n0 1 l\n0 100 l\n10 w\n0 6 m\n100 0 l')
+
+
+@pytest.mark.parametrize('use_numpy', (False, True))
+def test_bulk_paths(use_numpy, monkeypatch):
+    if use_numpy:
+        numpy = pytest.importorskip('numpy')
+        points = numpy.array(((0, 0), (1.5, 2.25), (100, -0.001)))
+    else:
+        monkeypatch.setattr(pydyf, 'numpy', None)
+        points = [(0, 0), (1.5, 2.25), (100, -0.001)]
+
+    draw = pydyf.Stream(precision=2)
+    draw.polyline(points)
+    draw.polygon(points, matrix=(2, 0, 0, 2, 5, 5))
+    draw.rectangles(array('d', (0, 0, 10, 20, 5, 5, 1, 1)), (2, 0, 0, 3, 1, 1))
+    draw.curves(memoryview(array('d', (0, 0, 1, 1, 2, 2))))
+    draw.polyline([])
+    draw.polyline(number for number in (1, 2, 3, 4))
+    draw.polyline([(1, 2), 3, 4])
+    assert bytes(draw.stream) == (
+        b'0 0 m\n1.5 2.25 l\n100 0 l\n'
+        b'5 5 m\n8 9.5 l\n205 5 l\nh\n'
+        b'1 1 20 60 re\n11 16 2 3 re\n'
+        b'0 0 1 1 2 2 c\n'
+        b'1 2 m\n3 4 l\n1 2 m\n3 4 l')
+
+    with pytest.raises(ValueError):
+        draw.polyline([0, 1, 2])
+    with pytest.raises(ValueError):
+        draw.curves([(0, 1), (2, 3)])
+    with pytest.raises(ValueError):
+        draw.rectangles([(0, 1, 2, 3)], (1, 1, 0, 1, 0, 0))
+
+
+def test_content():
+    draw = pydyf.Stream()
+    draw.stream.append('/Tag')
+    draw.stream.append(pydyf.Dictionary({'MCID': 0}))
+    draw.stream.append(b'')
+    draw.push_state()
+    assert bytes(draw.stream) == b'/Tag\n<</MCID 0>>\n\nq'
+    assert bytes(pydyf.Stream(draw.stream).stream) == bytes(draw.stream)
+    assert bytes(pydyf.Stream([b'q', b'Q']).stream) == b'q\nQ'
+    assert b'\nstream\n/Tag\n<</MCID 0>>\n\nq\nendstream' in draw.data
+
+
+def test_nested_objects():
+    array = deep = pydyf.Array()
+    for _ in range(10000):
+        deep.append(pydyf.Array())
+        deep = deep[0]
+    assert array.data == b'[' * 10001 + b']' * 10001
+    document = pydyf.PDF()
+    document.add_object(array)
+    tracemalloc.start()
+    try:
+        document.write(output := io.BytesIO())
+        assert tracemalloc.get_traced_memory()[1] < 20_000_000
+    finally:
+        tracemalloc.stop()
+    assert b'[' * 10001 + b']' * 10001 in output.getvalue()
+
+    shared = pydyf.Dictionary({'Type': '/Font', 'Widths': pydyf.Array([1])})
+    document = pydyf.PDF()
+    for i in range(3):
+        document.add_object(pydyf.Dictionary({'Font': shared, 'Index': i}))
+    document.write(output := io.BytesIO())
+    assert output.getvalue().count(b'<</Font <</Type /Font/Widths [1]>>') == 3
+    shared['Widths'].append(2)
+    document = pydyf.PDF()
+    document.add_object(pydyf.Array([shared, shared]))
+    document.write(output := io.BytesIO())
+    assert b'[<</Type /Font/Widths [1 2]>> <</Type /Font/Widths [1 2]>>]' in (
+        output.getvalue())
+
+
+def test_encoders(monkeypatch):
+    monkeypatch.setattr(pydyf, '_ENCODERS', pydyf._ENCODERS.copy())
+    monkeypatch.setattr(pydyf, '_TYPE_ENCODERS', {})
+    array = pydyf.Array([True, 1, 2.5, Decimal('0.1'), pydyf.String('a')])
+    assert array.data == b'[True 1 2.5 0.1 (a)]'
+    pydyf.register_encoder(Decimal, lambda item: f'{item:.2f}'.encode())
+    assert array.data == b'[True 1 2.5 0.10 (a)]'
+    draw = pydyf.Stream()
+    draw.move_to(Decimal(1), 2)
+    assert bytes(draw.stream) == b'1.00 2 m'
+
+
+@pytest.mark.parametrize('limits, sizes', (
+    ({}, [100, 100, 52]),
+    ({'objects_per_stream': None}, [252]),
+    ({'bytes_per_stream': 300}, [19, 21, 21, 21, 21, *[20] * 7, 9]),
+))
+def test_object_streams(limits, sizes):
+    document = pydyf.PDF()
+    for i in range(250):
+        document.add_object(pydyf.Dictionary({'Index': i}))
+    document.write(output := io.BytesIO(), compress=True, **limits)
+    streams = re.findall(rb'/Type /ObjStm/N (\d+)', output.getvalue())
+    assert [int(size) for size in streams] == sizes
+
+
+def test_write_fragments():
+    class Output:
+        def __init__(self):
+            self.chunks = []
+
+        def write(self, data):
+            self.chunks.append(bytes(data))
+
+    for output in (io.BytesIO(), Output()):
+        document = pydyf.PDF()
+        stream = pydyf.Stream([b'0 0 m', b'1 1 l'], compress=True)
+        document.add_object(stream)
+        document.write(output)
+        data = (
+            output.getvalue() if isinstance(output, io.BytesIO) else
+            b''.join(output.chunks))
+        assert len(data) == document.current_position
+        assert data[stream.offset:].startswith(b'3 0 obj\n<</Filter')
+
+
+@pytest.mark.parametrize('compress', (False, True))
+def test_write_async(compress):
+    class Writer:
+        def __init__(self):
+            self.output = io.BytesIO()
+            self.drains = 0
+
+        def write(self, data):
+            self.output.write(data)
+
+        async def drain(self):
+            self.drains += 1
+
+    outputs = []
+    for write_async in (False, True):
+        document = pydyf.PDF()
+        for i in range(3):
+            draw = pydyf.Stream(compress=True)
+            draw.rectangle(i, i, 5, 6)
+            document.add_object(draw)
+        if write_async:
+            writer = Writer()
+            asyncio.run(document.write_async(
+                writer, identifier=True, compress=compress))
+            assert writer.drains >= 3
+            outputs.append(writer.output.getvalue())
+        else:
+            document.write(
+                output := io.BytesIO(), identifier=True, compress=compress)
+            outputs.append(output.getvalue())
+    assert outputs[0] == outputs[1]
+
+    with pytest.raises(ValueError):
+        asyncio.run(document.write_async(writer := Writer(), deduplicate=True))
+    assert not writer.output.getvalue()
+
+
+def test_write_async_cancel():
+    class Writer:
+        def write(self, data):
+            pass
+
+        async def drain(self):
+            await asyncio.Event().wait()
+
+    document = pydyf.PDF()
+    for i in range(3):
+        draw = pydyf.Stream()
+        document.add_object(draw)
+        document.add_page(pydyf.Dictionary({
+            'Type': '/Page',
+            'Parent': document.pages.reference,
+            'Contents': draw.reference,
+        }))
+
+    async def cancel():
+        task = asyncio.create_task(
+            document.write_async(Writer(), page_tree_fanout=2))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel())
+    assert document.pages['Kids'] == [4, 0, 'R', 6, 0, 'R', 8, 0, 'R']
+    assert document.objects[4]['Parent'] == document.pages.reference
+    assert all(object_.free == 'f' for object_ in document.objects[9:])
+
+
+def test_page_tree():
+    document = pydyf.PDF()
+    pages = []
+    for i in range(10):
+        pages.append(pydyf.Dictionary({
+            'Type': '/Page',
+            'Parent': document.pages.reference,
+            'MediaBox': pydyf.Array([0, 0, 200, 200]),
+        }))
+        document.add_page(pages[-1])
+    references = document.page_references
+    assert len(references) == 10
+    assert references[0] == b'3 0 R'
+    assert references[-1] == references[9] == b'12 0 R'
+    assert references[8:] == (b'11 0 R', b'12 0 R')
+    with pytest.raises(IndexError):
+        references[10]
+
+    document.write(output := io.BytesIO(), page_tree_fanout=4)
+    kids = re.findall(rb'/Type /Pages/Kids \[([^]]*)\]', output.getvalue())
+    assert kids == [
+        b'13 0 R 14 0 R 15 0 R', b'3 0 R 4 0 R 5 0 R', b'6 0 R 7 0 R 8 0 R',
+        b'9 0 R 10 0 R 11 0 R 12 0 R']
+    assert b'/Kids [9 0 R 10 0 R 11 0 R 12 0 R]/Count 4/Parent 1 0 R' in (
+        output.getvalue())
+    assert pages[0]['Parent'] == document.pages.reference
+    assert document.page_references == references
+    assert len(document.pages['Kids']) == 30
+    assert all(document.objects[number].free == 'f' for number in (13, 14))
+
+    document.write(output := io.BytesIO())
+    data = output.getvalue()
+    assert data.count(b'/Parent 1 0 R') == 10
+    assert data.count(b'/Type /Pages') == 1
+    assert data.count(b' 0 obj') == 12
+
+
+def test_page_tree_update():
+    document = pydyf.PDF()
+    document.write(output := io.BytesIO())
+    update = pydyf.Update(output.getvalue())
+    with pytest.raises(ValueError):
+        update.write(output, page_tree_fanout=2)
+
+
+def test_page_tree_fragment():
+    document = pydyf.PDF()
+    for i in range(3):
+        document.add_fragment(_fragment_page(
+            len(document.objects), document.pages.reference, b'0 0 R', i))
+    with pytest.raises(ValueError):
+        document.write(io.BytesIO(), page_tree_fanout=2)
+
+
+def test_deduplicate():
+    document = pydyf.PDF()
+    images = []
+    for i in range(3):
+        image = pydyf.Stream([b'image'], {'Type': '/XObject'})
+        document.add_object(image)
+        images.append(image)
+        resources = pydyf.Dictionary({
+            'XObject': pydyf.Dictionary({'Im': image.reference})})
+        document.add_object(resources)
+        document.add_page(pydyf.Dictionary({
+            'Type': '/Page',
+            'Parent': document.pages.reference,
+            'Resources': resources.reference,
+            'MediaBox': pydyf.Array([0, 0, 10, 10]),
+        }))
+    document.write(output := io.BytesIO(), deduplicate=True)
+    data = output.getvalue()
+    assert data.count(b'stream\nimage') == 1
+    assert data.count(b'<</XObject <</Im 3 0 R>>>>') == 1
+    assert data.count(b'/Resources 4 0 R') == 3
+    assert data.count(b'0000000000 65535 f') == 5
+    assert document.objects[6] is images[1]
+
+
+def test_deduplicate_references():
+    document = pydyf.PDF()
+    first, second, third, fourth = (
+        pydyf.Dictionary({'Type': '/Font'}) for _ in range(4))
+    for font in (first, second, third, fourth):
+        document.add_object(font)
+    document.add_object(pydyf.Dictionary({
+        'Triple': pydyf.Array([second.number, 0, 'R']),
+        'String': f'{third.number} 0 R',
+        'Nested': pydyf.Array([pydyf.Array([first.number, 0, 'R'])]),
+        'Raw': f'[{fourth.number} 0 R]'.encode(),
+    }))
+    document.write(output := io.BytesIO(), deduplicate=True)
+    data = output.getvalue()
+    assert (
+        b'/Triple [3 0 R]/String 3 0 R/Nested [[3 0 R]]/Raw [3 0 R]' in data)
+    assert data.count(b'0000000000 65535 f') == 4
+    assert document.objects[6] is fourth
+    with pydyf.Reader(data) as reader:
+        assert reader[3] == {'Type': '/Font'}
+
+
+def test_write_failure():
+    class FailingOutput(io.BytesIO):
+        def write(self, data):
+            if self.tell() > 200:
+                raise OSError('Disconnected')
+            return super().write(data)
+
+    document = pydyf.PDF()
+    font = pydyf.Dictionary({'Type': '/Font'})
+    other_font = pydyf.Dictionary({'Type': '/Font'})
+    document.add_object(font)
+    document.add_object(other_font)
+    for i in range(3):
+        document.add_page(pydyf.Dictionary({
+            'Type': '/Page',
+            'Parent': document.pages.reference,
+            'Font': other_font.reference,
+        }))
+    with pytest.raises(OSError):
+        document.write(FailingOutput(), page_tree_fanout=2, deduplicate=True)
+    assert document.objects[4] is other_font
+    assert len(document.pages['Kids']) == 9
+    assert document._output is None
+    document.write(output := io.BytesIO())
+    with pydyf.Reader(output.getvalue()) as reader:
+        assert reader[4] == {'Type': '/Font'}
+        assert reader[5]['Parent'] == b'1 0 R'
+
+
+def test_deduplicate_stream():
+    document = pydyf.PDF()
+    document.begin(output := io.BytesIO())
+    with pytest.raises(ValueError):
+        document.write(output, deduplicate=True)
+
+
+def test_resources():
+    document = pydyf.PDF()
+    state = document.add_resource('ExtGState', {'CA': 0.5})
+    assert document.add_resource('ExtGState', {'CA': 0.5}) == state
+    other_state = document.add_resource('ExtGState', {'CA': 0.2})
+    assert (state, other_state) == ('GS0', 'GS1')
+    font = pydyf.Dictionary({'Type': '/Font', 'Subtype': '/Type1'})
+    assert document.add_resource('Font', font) == 'F0'
+    assert document.add_resource('Font', font) == 'F0'
+    assert len(document.objects) == 6
+
+    for names in ((state,), (state, other_state)):
+        draw = pydyf.Stream()
+        for name in names:
+            draw.set_state(name)
+        draw.set_state('Unknown')
+        document.add_object(draw)
+        document.add_page(pydyf.Dictionary({
+            'Type': '/Page',
+            'Parent': document.pages.reference,
+            'Contents': pydyf.Array([draw.reference]),
+            'MediaBox': pydyf.Array([0, 0, 10, 10]),
+        }))
+    document.write(output := io.BytesIO())
+    data = output.getvalue()
+    assert data.count(b'<</CA 0.5>>') == 1
+    assert b'/Resources <</ExtGState <</GS0 3 0 R>>>>' in data
+    assert b'/Resources <</ExtGState <</GS0 3 0 R/GS1 4 0 R>>>>' in data
+
+
+def test_resources_after_page():
+    document = pydyf.PDF()
+    state = document.add_resource('ExtGState', {'CA': 0.5})
+    draw = pydyf.Stream()
+    page = pydyf.Dictionary({
+        'Type': '/Page',
+        'Parent': document.pages.reference,
+        'Contents': f'{len(document.objects) + 1} 0 R'.encode(),
+        'MediaBox': pydyf.Array([0, 0, 10, 10]),
+    })
+    document.add_page(page)
+    document.add_object(draw)
+    draw.set_state(state)
+    document.write(output := io.BytesIO())
+    assert b'/Resources <</ExtGState <</GS0 3 0 R>>>>' in output.getvalue()
+
+    document = pydyf.PDF()
+    document.add_resource('ExtGState', {'CA': 0.5})
+    document.begin(output := io.BytesIO())
+    document.add_page(pydyf.Dictionary({
+        'Type': '/Page',
+        'Parent': document.pages.reference,
+        'Contents': b'10 0 R',
+    }))
+    assert b'/Resources <<>>' in output.getvalue()
+
+
+def test_streamed_resources():
+    document = pydyf.PDF()
+    document.begin(io.BytesIO())
+    draw = pydyf.Stream()
+    draw.set_state('GS0')
+    document.add_object(draw)
+    assert not document._flushed_resources
+
+    document = pydyf.PDF()
+    state = document.add_resource('ExtGState', {'CA': 0.5})
+    document.begin(output := io.BytesIO())
+    draw = pydyf.Stream()
+    assert draw._used_resources is None
+    draw.set_state(state)
+    document.add_object(draw)
+    assert document._flushed_resources
+    document.add_page(pydyf.Dictionary({
+        'Type': '/Page',
+        'Parent': document.pages.reference,
+        'Contents': draw.reference,
+    }))
+    assert not document._flushed_resources
+    assert b'/Resources <</ExtGState <</GS0 3 0 R>>>>' in output.getvalue()
+
+
+@pytest.mark.parametrize('use_numpy', (False, True))
+@pytest.mark.parametrize('predictor, filtered', (
+    (None, b'\0\1\2\3\4\5\n\13\14\15\16\17'),
+    ('up', b'\2\0\1\2\3\4\5\2\n\n\n\n\n\n'),
+    ('paeth', b'\4\0\1\2\3\3\3\4\n\n\n\3\3\3'),
+))
+def test_image(use_numpy, predictor, filtered, monkeypatch):
+    rows = [bytes(range(6)), bytes(range(10, 16))]
+    if use_numpy:
+        numpy = pytest.importorskip('numpy')
+        pixels = numpy.array([list(row) for row in rows], numpy.uint8)
+        image = pydyf.Image(pixels.reshape(2, 2, 3), predictor=predictor)
+    else:
+        monkeypatch.setattr(pydyf, 'numpy', None)
+        image = pydyf.Image(rows, width=2, predictor=predictor)
+    extra, stream = image._dictionary_and_stream()
+    assert zlib.decompress(stream) == filtered
+    assert extra['Width'] == extra['Height'] == 2
+    assert extra['ColorSpace'] == '/DeviceRGB'
+    assert extra['Filter'] == '/FlateDecode'
+    if predictor:
+        assert pydyf._unpredict(filtered, 6, 3) == b''.join(rows)
+        assert extra['DecodeParms']['Predictor'] == 15
+        assert extra['DecodeParms']['Colors'] == 3
+    else:
+        assert 'DecodeParms' not in extra
+
+    with pytest.raises(ValueError):
+        pydyf.Image(rows, width=3)
+    with pytest.raises(ValueError):
+        pydyf.Image(rows, width=2, color_space='Lab')
+    with pytest.raises(ValueError):
+        pydyf.Image(rows, width=2, height=3)
+    with pytest.raises(ValueError):
+        pydyf.Image(rows, width=2, predictor='unknown')
+
+
+@pytest.mark.parametrize('compress', (False, True))
+def test_update(compress):
+    document = pydyf.PDF()
+    draw = pydyf.Stream([b'0 0 10 10 re f'])
+    document.add_object(draw)
+    page = pydyf.Dictionary({
+        'Type': '/Page',
+        'Parent': document.pages.reference,
+        'Contents': draw.reference,
+        'MediaBox': pydyf.Array([0, 0, 10, 10]),
+    })
+    document.add_page(page)
+    document.write(output := io.BytesIO(), compress=compress, identifier=True)
+    original = output.getvalue()
+    xref_position = int(original.split()[-2])
+
+    update = pydyf.Update(original)
+    stamp = pydyf.Stream([b'5 5 1 1 re f'])
+    update.add_object(stamp)
+    new_page = pydyf.Dictionary(page)
+    new_page['Contents'] = pydyf.Array([draw.reference, stamp.reference])
+    update.replace_object(page.number, new_page)
+    with pytest.raises(ValueError):
+        update.replace_object(len(update.objects), new_page)
+    with pytest.raises(TypeError):
+        update.add_page(new_page)
+    update.write(output, identifier=True)
+    data = output.getvalue()
+
+    assert data.startswith(original)
+    assert b'/Catalog' not in data[len(original):]
+    assert data[stamp.offset:].startswith(f'{stamp.number} 0 obj'.encode())
+    assert f'/Prev {xref_position}'.encode() in data[len(original):]
+    identifiers = re.findall(rb'/ID \[(\(.*?\)) (\(.*?\))\]', data)
+    assert identifiers[1][0] == identifiers[0][0]
+    assert identifiers[1][1] != identifiers[0][1]
+    if not compress:
+        assert f'xref\n{page.number} 2\n'.encode() in data
+
+
+@pytest.mark.parametrize('compress', (False, True))
+def test_update_info(compress):
+    document = pydyf.PDF()
+    document.write(output := io.BytesIO(), compress=compress)
+    update = pydyf.Update(output.getvalue())
+    update.info['Title'] = pydyf.String('Title')
+    update.write(output)
+    with pydyf.Reader(output.getvalue()) as reader:
+        info = reader.resolve(reader.trailer['Info'])
+        assert info['Title'].string == b'Title'
+
+
+@pytest.mark.parametrize('compress', (False, True))
+def test_reader(compress, tmp_path):
+    document = pydyf.PDF()
+    document.info['Title'] = pydyf.String('Tïtle (1) \\')
+    document.add_object(document.info)
+    draw = pydyf.Stream([b'0 0 10 10 re f'], compress=True)
+    document.add_object(draw)
+    document.add_page(pydyf.Dictionary({
+        'Type': '/Page',
+        'Parent': document.pages.reference,
+        'Contents': draw.reference,
+        'MediaBox': pydyf.Array([0, 0.5, 10, -10]),
+        'Array': pydyf.Array(
+            [pydyf.String(b'\0\n)'), pydyf.Array(), pydyf.Dictionary()]),
+    }))
+    document.write(output := io.BytesIO(), compress=compress)
+
+    reader = pydyf.Reader(output.getvalue())
+    assert len(reader) == len(document.objects)
+    assert reader.catalog['Pages'] == b'1 0 R'
+    pages = reader.resolve(reader.catalog['Pages'])
+    assert pages['Kids'] == [b'5 0 R']
+    for object_ in document.objects[1:]:
+        read_object = reader[object_.number]
+        assert read_object.number == object_.number
+        if object_ is draw:
+            assert read_object.extra['Filter'] == '/FlateDecode'
+            assert zlib.decompress(read_object.stream.getvalue()) == (
+                b'0 0 10 10 re f')
+        elif not isinstance(object_, pydyf.Stream):
+            assert read_object.data == object_.data
+    with pytest.raises(KeyError):
+        reader[0]
+
+    update = pydyf.Update(output.getvalue())
+    page = reader[5]
+    page['MediaBox'] = pydyf.Array([0, 0, 20, 20])
+    update.replace_object(5, page)
+    update.write(output)
+    with pydyf.Reader(output.getvalue()) as reader:
+        assert reader[5]['MediaBox'] == [0, 0, 20, 20]
+        assert reader[4].extra['Filter'] == '/FlateDecode'
+
+    (path := tmp_path / 'test.pdf').write_bytes(output.getvalue())
+    with path.open('rb') as file:
+        sources = (path, file, io.BytesIO(output.getvalue()))
+        for source in sources:
+            with pydyf.Reader(source) as reader:
+                assert reader[5]['MediaBox'] == [0, 0, 20, 20]
+
+
+def test_frozen_object(monkeypatch):
+    monkeypatch.setattr(pydyf, '_FROZEN_OBJECTS', OrderedDict())
+    monkeypatch.setattr(pydyf, '_frozen_objects_size', 0)
+    monkeypatch.setattr(pydyf, '_frozen_cache_size', 1000)
+    calls = []
+
+    def logo():
+        calls.append(None)
+        return pydyf.Stream([b'logo'], {'Type': '/XObject'}, compress=True)
+
+    outputs = []
+    for index in range(2):
+        document = pydyf.PDF()
+        for _ in range(index):
+            document.add_object(pydyf.Dictionary())
+        frozen = pydyf.frozen_object('logo', logo)
+        document.add_object(frozen)
+        document.add_object(pydyf.FrozenObject(pydyf.Dictionary({'A': 1})))
+        document.write(output := io.BytesIO(), compress=True)
+        outputs.append(output.getvalue())
+        assert frozen.number == 3 + index
+    assert len(calls) == 1
+    assert outputs[0].count(b'obj\n<</Type /XObject/Filter /FlateDecode') == 1
+    assert outputs[1].count(b'4 0 obj\n<</Type /XObject/Filter') == 1
+    assert pydyf.Reader(outputs[1])[5] == {'A': 1}
+
+    pydyf.set_frozen_cache_size(0)
+    assert not pydyf._FROZEN_OBJECTS
+    pydyf.frozen_object('logo', logo)
+    assert len(calls) == 2
+
+
+def test_slots():
+    stream = pydyf.Stream([b'0 0 m'], compress=True)
+    stream.set_state('GS0')
+    for object_ in (
+            pydyf.Dictionary({'A': 1}), pydyf.Array([1]), pydyf.String('a'),
+            stream):
+        object_.number = 1
+        assert not vars(object_)
+        copy = pickle.loads(pickle.dumps(object_))
+        assert copy.number == 1
+        assert copy.data == object_.data